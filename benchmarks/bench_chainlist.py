@@ -0,0 +1,57 @@
+"""
+Сравнение времени старта: разбор всего chain_list.json в BoxList против индекса ChainlistIndex.
+Запуск из корня проекта: python -m benchmarks.bench_chainlist [chainId]
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from box import BoxList
+
+from utils.chainlist_index import ChainlistIndex
+
+JSON_PATH = Path('utils/chain_list.json')
+
+
+def measure(func, repeats: int = 5) -> float:
+    """Лучшее время из repeats запусков, мс."""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def old_path(chain_id: int):
+    with open(JSON_PATH, 'r', encoding='utf-8') as f:
+        chains_list = BoxList(json.load(f))
+    for chain in chains_list:
+        if chain_id == chain.chainId:
+            return BoxList(chain.rpc)
+    return None
+
+
+def main():
+    chain_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ChainlistIndex(JSON_PATH, Path(tmp) / 'chain_list.sqlite')
+        build_ms = measure(index.build, repeats=1)
+        assert len(index.rpc(chain_id)) == len(old_path(chain_id))
+
+        results = [
+            ("JSON + BoxList + линейный поиск (старый путь)", measure(lambda: old_path(chain_id))),
+            ("Построение индекса (один раз при обновлении кэша)", build_ms),
+            ("Поиск по индексу (новый путь при старте)",
+             measure(lambda: ChainlistIndex(JSON_PATH, index.index_path).rpc(chain_id))),
+        ]
+
+    print(f"chainId={chain_id}")
+    for name, ms in results:
+        print(f"{name:<55} {ms:10.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
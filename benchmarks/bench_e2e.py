@@ -0,0 +1,149 @@
+"""
+Офлайн-бенчмарк полного прогона main.main() на локальных заглушках Gas.zip и EVM-узла (benchmarks/stubs.py).
+Газ не тратится: ключи генерируются случайно, балансы и чеки отдаёт заглушка.
+Показывает кошельков в секунду, RPC-вызовов на кошелёк и пиковую память. Завершается с кодом 1, если узел
+получил не по депозиту на каждый непыльный кошелёк (и повтор DEPOSITS_PER_WALLET), а с --min-wps и
+--max-calls-per-wallet — также при регрессии скорости или числа вызовов.
+Запуск из корня проекта: python -m benchmarks.bench_e2e --wallets 2000 --async
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+from eth_account import Account
+
+from benchmarks.stubs import EvmStub, GasZipStub
+
+try:
+    import resource
+except ImportError:  # Windows: пиковая память не замеряется
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_workdir(workdir: Path, args, gas_zip_url: str, rpc_url: str, private_keys):
+    """setting.yaml проекта с адресами заглушек и private_keys.txt со случайными ключами."""
+    with open(ROOT / 'setting.yaml', 'r', encoding='utf-8') as f:
+        settings = yaml.safe_load(f)
+    settings.update({
+        'INPUT_CHAIN': 'StubIn',
+        'OUTPUT_CHAIN': args.output_chain,
+        'TIMEOUT': [0, 0],
+        'ASYNC_MODE': args.use_async,
+        'CONCURRENCY': args.concurrency,
+        'START_JITTER': 0,
+        'GAS_ZIP_API': gas_zip_url,
+        'RPC_URLS': [rpc_url],
+        'RATE_LIMIT_RPS': args.rate_limit,
+        'RATE_LIMIT_BURST': args.rate_limit,
+        'RATE_LIMIT_MAX_RPS': args.rate_limit,
+        'RATE_LIMITS': {},
+        'RECEIPT_TIMEOUT': 60,
+        'GAS_ZIP_STATUS_TIMEOUT': 0,
+        'DEPOSITS_PER_WALLET': args.deposits,
+        'JOURNAL_PATH': str(workdir / 'journal.sqlite'),
+        'TRIAGE_REPORT': str(workdir / 'triage.csv'),
+        'METRICS_FILE': str(workdir / 'metrics.json'),
+        'METRICS_PORT': 0,
+    })
+    with open(workdir / 'setting.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump(settings, f, allow_unicode=True)
+    with open(workdir / 'private_keys.txt', 'w', encoding='utf-8') as f:
+        f.writelines(key + '\n' for key in private_keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк main.main() на заглушках")
+    parser.add_argument('--wallets', type=int, default=1000)
+    parser.add_argument('--async', dest='use_async', action='store_true', help="асинхронный режим (ASYNC_MODE)")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--deposits', type=int, default=1)
+    parser.add_argument('--output-chain', default='StubOut', help="например 'StubOut, StubOut2'")
+    parser.add_argument('--rpc-latency', type=float, default=0.0, help="задержка ответа узла, секунд")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Gas.zip, секунд")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503 от узла")
+    parser.add_argument('--block-time', type=float, default=0.5)
+    parser.add_argument('--dust-ratio', type=float, default=0.0, help="доля кошельков с пыльным балансом")
+    parser.add_argument('--rate-limit', type=float, default=100000, help="RATE_LIMIT_RPS для заглушек")
+    parser.add_argument('--min-wps', type=float, help="минимум кошельков в секунду (иначе код 1)")
+    parser.add_argument('--max-calls-per-wallet', type=float, help="максимум RPC-вызовов на кошелёк (иначе код 1)")
+    parser.add_argument('--json', type=Path, help="сохранить результат в JSON")
+    parser.add_argument('--verbose', action='store_true', help="не глушить лог прогона")
+    args = parser.parse_args()
+    if args.json:
+        args.json = args.json.resolve()
+
+    gas_zip = GasZipStub(latency=args.api_latency).start()
+    node = EvmStub(block_time=args.block_time, dust_ratio=args.dust_ratio,
+                   latency=args.rpc_latency, error_rate=args.error_rate).start()
+    private_keys = ['0x' + os.urandom(32).hex() for _ in range(args.wallets)]
+    # Кошельки с «пыльным» балансом заглушки депозит не отправляют
+    dust = sum(node.is_dust(Account.from_key(key).address) for key in private_keys)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            write_workdir(workdir, args, gas_zip.url, node.url, private_keys)
+            # utils.config читает setting.yaml и private_keys.txt из текущего каталога при импорте
+            os.chdir(workdir)
+            sys.path.insert(0, str(ROOT))
+            from loguru import logger
+            if not args.verbose:
+                logger.remove()
+                logger.add(sys.stderr, level='WARNING')
+            import main as bridge
+
+            started = time.perf_counter()
+            try:
+                bridge.main()
+            finally:
+                os.chdir(ROOT)
+            elapsed = time.perf_counter() - started
+    finally:
+        gas_zip.stop()
+        node.stop()
+
+    sent = node.calls['eth_sendRawTransaction']
+    # Выходные сети через запятую получают равные веса: один комбинированный депозит на каждый повтор
+    expected = (args.wallets - dust) * args.deposits
+    result = {
+        'wallets': args.wallets,
+        'mode': 'async' if args.use_async else 'sync',
+        'elapsed_s': round(elapsed, 3),
+        'wallets_per_s': round(args.wallets / elapsed, 2),
+        'transactions': sent,
+        'expected_transactions': expected,
+        'dust_wallets': dust,
+        'rpc_calls': node.rpc_calls,
+        'rpc_http_requests': node.calls['http'],
+        'rpc_calls_per_wallet': round(node.rpc_calls / args.wallets, 2),
+        'gas_zip_requests': sum(gas_zip.calls.values()),
+        'rpc_calls_by_method': dict(node.calls.most_common()),
+    }
+    if resource is not None:
+        # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['max_rss_mb'] = round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    failed = []
+    if sent != expected:
+        failed.append(f"отправлено транзакций {sent}, ожидалось {expected}")
+    if args.min_wps is not None and result['wallets_per_s'] < args.min_wps:
+        failed.append(f"кошельков/с {result['wallets_per_s']} < {args.min_wps}")
+    if args.max_calls_per_wallet is not None and result['rpc_calls_per_wallet'] > args.max_calls_per_wallet:
+        failed.append(f"RPC-вызовов на кошелёк {result['rpc_calls_per_wallet']} > {args.max_calls_per_wallet}")
+    if failed:
+        print("Регрессия: " + "; ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Сравнение разбора ответов в python-box и в модели pydantic (utils/models.py): время и память.
+Данные: utils/chain_list.json и типовые ответы Gas.zip (/v2/chains, /v2/quotes). Сеть не нужна.
+Запуск из корня проекта: python -m benchmarks.bench_models [повторов]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+from box import Box, BoxList
+from pydantic import BaseModel, TypeAdapter
+
+from benchmarks.stubs import DEPOSIT_CONTRACT, GasZipStub
+from utils.models import ChainList, ChainRpc, Quote
+
+JSON_PATH = Path('utils/chain_list.json')
+
+QUOTE_PAYLOAD = json.dumps({
+    'quotes': [{'chain': 31338, 'expected': str(10 ** 15), 'gas': '21000', 'speed': 5, 'usd': 3.0}],
+    'contractDepositTxn': {'to': DEPOSIT_CONTRACT, 'data': '0x7a69', 'value': hex(10 ** 15)},
+}).encode('utf-8')
+CHAINS_PAYLOAD = json.dumps({'chains': GasZipStub.CHAINS * 100}).encode('utf-8')
+
+
+class ChainlistEntry(BaseModel):
+    """Сеть из chain_list.json: только поля, нужные для поиска RPC."""
+    chainId: int
+    name: str = ''
+    rpc: List[ChainRpc] = []
+
+
+chainlist_adapter = TypeAdapter(List[ChainlistEntry])
+
+
+def measure(func, repeats: int) -> float:
+    """Лучшее время из repeats запусков, мс."""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def memory(func) -> tuple:
+    """(пик при разборе, удерживаемый результатом объём), КБ."""
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / 1024, current / 1024
+
+
+def box_chainlist(raw: bytes, chain_id: int):
+    chains_list = BoxList(json.loads(raw))
+    for chain in chains_list:
+        if chain_id == chain.chainId:
+            return chains_list, BoxList(chain.rpc)
+    return chains_list, None
+
+
+def model_chainlist(raw: bytes, chain_id: int):
+    chains_list = chainlist_adapter.validate_json(raw)
+    for chain in chains_list:
+        if chain_id == chain.chainId:
+            return chains_list, chain.rpc
+    return chains_list, None
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    raw = JSON_PATH.read_bytes()
+    assert [rpc.url for rpc in model_chainlist(raw, 1)[1]] == [rpc.url for rpc in box_chainlist(raw, 1)[1]]
+
+    cases = [
+        ("chain_list.json: json + BoxList (старый путь)", lambda: box_chainlist(raw, 1), repeats),
+        ("chain_list.json: pydantic validate_json", lambda: model_chainlist(raw, 1), repeats),
+        ("/v2/chains x100: json + Box (старый путь)", lambda: Box(json.loads(CHAINS_PAYLOAD)), repeats * 20),
+        ("/v2/chains x100: ChainList.model_validate_json",
+         lambda: ChainList.model_validate_json(CHAINS_PAYLOAD), repeats * 20),
+        ("quote: json + Box (старый путь)", lambda: Box(json.loads(QUOTE_PAYLOAD)).contractDepositTxn.value,
+         repeats * 2000),
+        ("quote: Quote.model_validate_json", lambda: Quote.model_validate_json(QUOTE_PAYLOAD).contractDepositTxn.value,
+         repeats * 2000),
+    ]
+    print(f"{'':<50} {'время, мс':>10} {'пик, КБ':>10} {'держит, КБ':>11}")
+    for name, func, count in cases:
+        ms = measure(func, count)
+        peak_kb, retained_kb = memory(func)
+        print(f"{name:<50} {ms:10.3f} {peak_kb:10.0f} {retained_kb:11.0f}")
+
+
+if __name__ == '__main__':
+    main()
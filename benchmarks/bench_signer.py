@@ -0,0 +1,63 @@
+"""
+Сравнение вывода адресов и подписи: последовательно в одном процессе против KeySigner (пул процессов).
+Ключи генерируются случайно, сеть не нужна.
+Запуск из корня проекта: python -m benchmarks.bench_signer [число ключей] [число процессов]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from eth_account import Account
+
+from utils.signer import KeySigner
+
+TX_TEMPLATE = {
+    'type': '0x2',
+    'to': '0x391E7C679d29bD940d63be94AD22A25d25b5A604',
+    'value': 10 ** 15,
+    'data': '0x01',
+    'chainId': 1,
+    'maxPriorityFeePerGas': 10 ** 9,
+    'maxFeePerGas': 3 * 10 ** 10,
+    'gas': 30000,
+    'nonce': 0,
+}
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+async def sign_all(signer: KeySigner, private_keys):
+    await asyncio.gather(*(signer.async_sign(TX_TEMPLATE, key) for key in private_keys))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    private_keys = ['0x' + os.urandom(32).hex() for _ in range(count)]
+    signer = KeySigner(workers=workers, min_parallel=0)
+    try:
+        signer.derive_addresses(private_keys[:signer.workers])  # запуск процессов не входит в замер
+        results = [
+            ("Адреса: последовательно (старый путь)",
+             timed(lambda: [Account.from_key(key).address for key in private_keys])),
+            (f"Адреса: KeySigner, процессов {signer.workers}", timed(lambda: signer.derive_addresses(private_keys))),
+            ("Подпись: последовательно (старый путь)",
+             timed(lambda: [Account.sign_transaction(TX_TEMPLATE, key) for key in private_keys])),
+            (f"Подпись: KeySigner.async_sign, процессов {signer.workers}",
+             timed(lambda: asyncio.run(sign_all(signer, private_keys)))),
+        ]
+    finally:
+        signer.close()
+
+    print(f"Ключей: {count}")
+    for name, seconds in results:
+        print(f"{name:<45} {seconds:8.2f} с {count / seconds:12.0f} ключей/с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Локальные заглушки для офлайн-бенчмарков: API Gas.zip и JSON-RPC узел EVM-сети.
+Узел хранит балансы и nonce в памяти, выпускает блоки раз в block_time секунд, принимает пакетные запросы
+и умеет отвечать с задержкой и случайными ошибками 503.
+"""
+import json
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_account import Account
+from eth_utils import keccak
+
+CHAIN_ID = 31337
+DEPOSIT_CONTRACT = '0x391E7C679d29bD940d63be94AD22A25d25b5A604'
+GWEI = 10 ** 9
+
+
+class StubServer(ABC):
+    """HTTP-сервер заглушки в фоновом потоке с keep-alive, задержкой и долей ошибок."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @abstractmethod
+    def handle(self, method: str, path: str, body: bytes):
+        """Возвращает (статус, объект для JSON-ответа)."""
+
+    def count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> "StubServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, method: str):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.error_rate and random.random() < stub.error_rate:
+                    status, payload = 503, {'error': 'stub overloaded'}
+                else:
+                    status, payload = stub.handle(method, self.path, body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class GasZipStub(StubServer):
+    """Заглушка API Gas.zip: /v2/chains, /v2/quotes/{сеть}/{wei}/{сети}, /v2/deposit/{хэш}."""
+
+    CHAINS = [
+        {'name': 'StubIn', 'chain': CHAIN_ID, 'short': 1, 'symbol': 'ETH', 'price': 3000, 'decimals': 18,
+         'minOutboundNative': str(10 ** 14), 'maxOutboundNative': str(10 ** 20),
+         'explorer': 'https://explorer.invalid/', 'inbound': True},
+        {'name': 'StubOut', 'chain': 31338, 'short': 2, 'symbol': 'ETH', 'price': 3000, 'decimals': 18,
+         'minOutboundNative': str(10 ** 14), 'maxOutboundNative': str(10 ** 20),
+         'explorer': 'https://explorer.invalid/', 'inbound': True},
+        {'name': 'StubOut2', 'chain': 31339, 'short': 3, 'symbol': 'ETH', 'price': 3000, 'decimals': 18,
+         'minOutboundNative': str(10 ** 14), 'maxOutboundNative': str(10 ** 20),
+         'explorer': 'https://explorer.invalid/', 'inbound': True},
+    ]
+
+    def handle(self, method: str, path: str, body: bytes):
+        path = path.split('?')[0]
+        if path == '/v2/chains':
+            self.count('chains')
+            return 200, {'chains': self.CHAINS}
+        match = re.fullmatch(r'/v2/quotes/(\d+)/(\d+)/([\d,]+)', path)
+        if match:
+            self.count('quotes')
+            deposit_wei, outbound = int(match.group(2)), match.group(3).split(',')
+            data = '0x' + ''.join(f"{int(chain):04x}" for chain in outbound)
+            return 200, {
+                'quotes': [{'chain': int(chain), 'expected': str(deposit_wei // len(outbound))} for chain in outbound],
+                'contractDepositTxn': {'to': DEPOSIT_CONTRACT, 'data': data, 'value': hex(deposit_wei)},
+            }
+        if path.startswith('/v2/deposit/'):
+            self.count('deposit')
+            return 200, {'txs': [{'status': 'CONFIRMED'}]}
+        return 404, {'error': 'not found'}
+
+
+class EvmStub(StubServer):
+    """
+    JSON-RPC узел: балансы по адресам (доля «пыльных» кошельков задаётся dust_ratio),
+    pending nonce, eth_feeHistory, eth_estimateGas, eth_call, eth_sendRawTransaction и чеки в следующем блоке.
+    """
+
+    def __init__(self, block_time: float = 1.0, balance: int = 10 ** 18, dust_ratio: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.block_time = block_time
+        self.balance = balance
+        self.dust_ratio = dust_ratio
+        self.started = time.monotonic()
+        self.nonces = Counter()
+        self.transactions = {}
+
+    @property
+    def block_number(self) -> int:
+        return 100 + int((time.monotonic() - self.started) / self.block_time)
+
+    def is_dust(self, address: str) -> bool:
+        """Детерминированно: одни и те же адреса всегда «пыль» или нет."""
+        return int(address[-4:], 16) / 0x10000 < self.dust_ratio
+
+    def _balance(self, address: str) -> int:
+        return 10 ** 12 if self.is_dust(address) else self.balance
+
+    def _receipt(self, tx_hash: str):
+        tx = self.transactions.get(tx_hash)
+        if tx is None or tx['blockNumber'] >= self.block_number:
+            return None
+        return {
+            'transactionHash': tx_hash, 'transactionIndex': '0x0', 'blockNumber': hex(tx['blockNumber'] + 1),
+            'blockHash': '0x' + keccak(text=str(tx['blockNumber'] + 1)).hex(), 'from': tx['from'],
+            'to': DEPOSIT_CONTRACT, 'cumulativeGasUsed': hex(30000), 'gasUsed': hex(30000),
+            'effectiveGasPrice': hex(2 * GWEI), 'contractAddress': None, 'logs': [],
+            'logsBloom': '0x' + '00' * 256, 'status': '0x1', 'type': '0x2',
+        }
+
+    def call(self, method: str, params: list):
+        self.count(method)
+        if method == 'eth_chainId':
+            return hex(CHAIN_ID)
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_getBalance':
+            return hex(self._balance(params[0]))
+        if method == 'eth_getTransactionCount':
+            return hex(self.nonces[params[0].lower()])
+        if method == 'eth_feeHistory':
+            blocks = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+            return {
+                'oldestBlock': hex(self.block_number - blocks + 1),
+                'baseFeePerGas': [hex(GWEI)] * (blocks + 1),
+                'gasUsedRatio': [0.5] * blocks,
+                'reward': [[hex(GWEI // 10 * (i + 1)) for i in range(len(params[2]))]] * blocks,
+            }
+        if method == 'eth_maxPriorityFeePerGas':
+            return hex(GWEI // 10)
+        if method == 'eth_gasPrice':
+            return hex(2 * GWEI)
+        if method == 'eth_estimateGas':
+            return hex(30000)
+        if method == 'eth_call':
+            return '0x'
+        if method == 'eth_sendRawTransaction':
+            raw = bytes.fromhex(params[0][2:])
+            tx_hash = '0x' + keccak(raw).hex()
+            sender = Account.recover_transaction(raw)
+            with self._lock:
+                self.nonces[sender.lower()] += 1
+                self.transactions[tx_hash] = {'from': sender, 'blockNumber': self.block_number}
+            return tx_hash
+        if method == 'eth_getTransactionReceipt':
+            return self._receipt(params[0])
+        if method == 'eth_getTransactionByHash':
+            tx = self.transactions.get(params[0])
+            return None if tx is None else {'hash': params[0], 'from': tx['from'], 'blockNumber': None}
+        raise KeyError(method)
+
+    def _dispatch(self, request: dict) -> dict:
+        try:
+            result = self.call(request['method'], request.get('params') or [])
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+        except KeyError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': f"{e} not found"}}
+
+    def handle(self, method: str, path: str, body: bytes):
+        self.count('http')
+        request = json.loads(body or b'{}')
+        if isinstance(request, list):
+            return 200, [self._dispatch(item) for item in request]
+        return 200, self._dispatch(request)
+
+    @property
+    def rpc_calls(self) -> int:
+        return sum(count for name, count in self.calls.items() if name.startswith('eth_'))
@@ -1,22 +1,79 @@
+import argparse
+import asyncio
 import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Optional
 from loguru import logger
 import random
-from utils.blockchain import TransactionSender
-from utils.config import config, private_keys, chains_list
+from utils.async_pipeline import run_async
+from utils.blockchain import connect_sender
+from utils.config import config, private_keys, chains_list, transport
+from utils.fee_oracle import make_fee_oracle
+from utils.journal import RunJournal, reconcile
+from utils.metrics import metrics
+from utils.receipt_tracker import ReceiptTracker
+from utils.rpc_pool import RpcPool
+from utils.signer import KeySigner
+from utils.simulator import execute_plan, load_plan, log_plan, simulate, write_plan
+from utils.sweep import run_sweep
+from utils.triage import log_triage, prescan, prescan_threshold, write_triage_report
 from utils.functions import (check_load_configuration,
                              search_two_chain,
-                             request_gas_zip,
+                             search_sweep_chains,
+                             build_routes,
+                             plan_deposits,
+                             load_support_chains,
                              get_quote,
-                             search_chain)
+                             deposit_template,
+                             chain_rpc_urls,
+                             quote_cache,
+                             GAS_ZIP_API)
 
 
-def main():
-    """Основная функция программы."""
+def report_metrics():
+    """Итоговая таблица времени по этапам и выгрузка метрик в METRICS_FILE."""
+    metrics.log_summary()
+    if config.get('METRICS_FILE'):
+        metrics.write(Path(config.METRICS_FILE))
+    metrics.close()
+
+
+def close_tracker(tracker: ReceiptTracker, outbound_timeout: float):
+    """
+    Закрытие трекера для ExitStack: после обычного завершения он дожидается чеков,
+    а после ошибки или Ctrl+C не ждёт — неподтверждённые транзакции перепроверит --resume.
+    """
+    def close(exc_type, exc, traceback):
+        if exc_type is None:
+            tracker.close(outbound_timeout)
+        else:
+            tracker.close(join_timeout=0)
+    return close
+
+
+def main(resume: Optional[str] = None, simulate_path: Optional[str] = None, plan_path: Optional[str] = None):
+    """
+    Основная функция программы.
+    :param resume: Идентификатор прогона из журнала, который нужно продолжить ('latest' — последний)
+    :param simulate_path: Пробный прогон без отправки: план со всеми суммами и газом сохраняется в этот файл
+    :param plan_path: Выполнить план из файла, сохранённый через --simulate
+    """
+    # Завершение общее для всех режимов и выполняется и при исключении (в том числе Ctrl+C):
+    # трекер, журнал и пул подписи закрываются в обратном порядке, статистика пишется всегда
+    with ExitStack() as cleanup:
+        run(cleanup, resume, simulate_path, plan_path)
+
+
+def run(cleanup: ExitStack, resume: Optional[str], simulate_path: Optional[str], plan_path: Optional[str]):
+    """Прогон в выбранном режиме; ресурсы регистрируются в cleanup сразу после создания."""
 
     # 1. Проверяем загрузку из файла config.yaml, private_keys.txt и chain_list.json
     if not check_load_configuration(config, private_keys, chains_list):
         logger.error("Выходим!")
         return
+    if int(config.get('METRICS_PORT', 0)):
+        metrics.serve(int(config.METRICS_PORT))
 
     # 2. Получаем и проверяем настройки задержки и таймаут
     try:
@@ -37,52 +94,193 @@ def main():
                      f" amount_out:[{amount_out[0]},{amount_out[1]}], завершение...")
         return
 
-    # 3. Получаем данные о всех поддерживаемых сетях в бридже Gas_zip
-    url = "https://backend.gas.zip/v2/chains"
-    support_chains = request_gas_zip(url=url)
-    # Ищем входную и выходную сеть в поддерживаемых сетях
-    input_chain, output_chain = search_two_chain(support_chains)
+    # 3. Получаем данные о всех поддерживаемых сетях в бридже Gas_zip (из кэша с условным запросом)
+    support_chains = load_support_chains()
+    if support_chains is None:
+        logger.error("Не удалось получить список сетей Gas.zip. Выходим!")
+        return
+    cleanup.callback(report_metrics)
+    cleanup.callback(transport.log_stats)
+    cleanup.callback(quote_cache.log_stats)
+
+    # Сбор средств с нескольких входных сетей: у каждой сети своя очередь кошельков, пул RPC и параллельность,
+    # сети обрабатываются одновременно
+    if config.get('INPUT_CHAINS'):
+        if resume or simulate_path or plan_path:
+            logger.error("--resume, --simulate и --plan работают только с одной входной сетью (INPUT_CHAIN). Выходим!")
+            return
+        input_chains, output_chains = search_sweep_chains(support_chains)
+        if input_chains is None:
+            logger.error("Не удалось определить название сети. Выходим!")
+            return
+        signer = KeySigner(workers=int(config.get('SIGNER_WORKERS', 0)))
+        cleanup.callback(signer.close)
+        addresses = dict(zip(private_keys, signer.derive_addresses(private_keys)))
+        asyncio.run(run_sweep(input_chains, output_chains, addresses, amount_out,
+                              deposits=max(int(config.get('DEPOSITS_PER_WALLET', 1)), 1),
+                              start_jitter=float(config.get('START_JITTER', 0)), signer=signer,
+                              outbound_timeout=float(config.get('GAS_ZIP_STATUS_TIMEOUT', 0)),
+                              progress_interval=float(config.get('PROGRESS_INTERVAL', 30))))
+        logger.success("Все входные сети обработаны. Завершение работы.")
+        return
 
-    if input_chain is None or output_chain is None:
+    # Ищем входную и выходные сети в поддерживаемых сетях
+    input_chain, output_chains = search_two_chain(support_chains)
+
+    if input_chain is None or output_chains is None:
         logger.error("Не удалось определить название сети. Выходим!")
         return
+    plan = None
+    if plan_path:
+        plan = load_plan(Path(plan_path))
+        if plan is None:
+            return
+        if plan.input_chain != input_chain.name:
+            logger.error(f"План составлен для сети {plan.input_chain}, а INPUT_CHAIN — {input_chain.name}. Выходим!")
+            return
+    # Маршруты депозитов: одна транзакция сразу во все выходные сети или отдельные депозиты по весам
+    routes = build_routes(output_chains)
+    output_chain = routes[0][0]
     # Проверка выходной сети на перевод средств
     # if not output_chain.inbound:
     #     logger.error(f"Перевод средств в сеть {config.OUTPUT_CHAIN} в настоящее время недоступен через Gas.zip")
     #     return
 
-    # Получаем rpc для входной сети из списка всех сетей chain_list.org
-    chain_rpc = search_chain(input_chain.chain, chains_list)
-    if chain_rpc is None:
+    # Получаем rpc для входной сети из списка всех сетей chain_list.org (или из RPC_URLS в setting.yaml)
+    rpc_urls = chain_rpc_urls(input_chain)
+    if rpc_urls is None:
         logger.error(f"Не смог найти RPC для сети {input_chain.name} в файле chain_rpc.json")
         return
 
-    # 4. Основной цикл по кошелькам
+    # Один раз опрашиваем все RPC сети, пул общий для всех кошельков
+    rpc_pool = RpcPool(rpc_urls, transport=transport)
+    if not rpc_pool.probe_all():
+        logger.error(f"Ни один RPC сети {input_chain.name} не отвечает. Выходим!")
+        return
+
+    # Сколько депозитов отправлять с одного кошелька (сумма делится поровну)
+    deposits = max(int(config.get('DEPOSITS_PER_WALLET', 1)), 1)
+    tx_per_wallet = deposits * len(routes)
+
+    # Параметры газа общие для всех кошельков в пределах блока
+    fee_oracle = make_fee_oracle()
+    cleanup.callback(fee_oracle.log_stats)
+
+    # Адреса всех кошельков считаем заранее, для больших файлов ключей — в пуле процессов
+    signer = KeySigner(workers=int(config.get('SIGNER_WORKERS', 0)))
+    cleanup.callback(signer.close)
+    addresses = dict(zip(private_keys, signer.derive_addresses(private_keys)))
+
+    # Пробный прогон: балансы, оценки газа и финальные quote всех кошельков пакетами, без отправки транзакций;
+    # журнал не ведётся, план сохраняется в файл
+    if simulate_path:
+        plan = simulate([address for address in addresses.values() if address is not None], input_chain,
+                        routes, rpc_pool, fee_oracle, amount_out, deposits=deposits,
+                        ttl=float(config.get('PLAN_TTL', 600)), concurrency=int(config.get('CONCURRENCY', 10)))
+        log_plan(plan, input_chain.decimals, input_chain.symbol)
+        write_plan(plan, Path(simulate_path))
+        return
 
-    for i, private_key in enumerate(private_keys):
+    # Журнал прогона: этапы каждого кошелька, чтобы после падения продолжить с места остановки
+    journal = RunJournal(Path(config.get('JOURNAL_PATH', 'journal.sqlite')))
+    cleanup.callback(journal.close)
+    if resume:
+        if journal.resume_run(None if resume == 'latest' else resume) is None:
+            logger.error(f"Прогон {resume} не найден в журнале {journal.path}. Выходим!")
+            return
+    else:
+        journal.start_run(input_chain.name, ', '.join(chain.name for chain, _ in routes))
+
+    # Чеки транзакций подтверждаются в фоне, отправка не ждёт включения в блок
+    explorer_url = input_chain.explorer.rstrip('/')
+
+    def on_confirmed(tx):
+        journal.record(tx.address, 'confirmed', tx.hex)
+        logger.success(f"Транзакция подтверждена в блоке {tx.block_number}: {explorer_url}/tx/{tx.hex}")
+
+    def on_reverted(tx):
+        journal.record(tx.address, 'reverted', tx.hex)
+        logger.error(f"Транзакция откатилась: {explorer_url}/tx/{tx.hex}")
+
+    def on_replaced(tx):
+        for tx_hash in tx.replaced:
+            journal.record(tx.address, 'replaced', tx_hash)
+
+    tracker = ReceiptTracker(
+        rpc_pool,
+        timeout=float(config.get('RECEIPT_TIMEOUT', 300)),
+        gas_zip_api=GAS_ZIP_API if config.get('TRACK_GAS_ZIP_STATUS', True) else None,
+        outbound_batch=int(config.get('GAS_ZIP_STATUS_BATCH', 20)),
+        on_confirmed=on_confirmed,
+        on_reverted=on_reverted,
+        on_timeout=lambda tx: logger.error(f"Транзакция не подтверждена за отведённое время: "
+                                           f"{explorer_url}/tx/{tx.hex}"),
+        on_replaced=on_replaced,
+    ).start()
+    cleanup.push(close_tracker(tracker, float(config.get('GAS_ZIP_STATUS_TIMEOUT', 0))))
+
+    # При продолжении пропускаем завершённые кошельки, а неподтверждённые транзакции перепроверяем одним пакетом
+    wallet_keys = list(private_keys)
+    sent = {}  # сколько транзакций уже отправлено с кошельков, обработанных не до конца
+    if resume:
         try:
-            sender = None
-            # Перебираем все доступные RPC для этой сети
-            for rpc_item in chain_rpc:
-                try:
-                    current_url = rpc_item.url
-                    # Пытаемся инициализировать отправителя
-                    temp_sender = TransactionSender(private_key, current_url, input_chain)
-
-                    # Делаем тестовый легкий запрос, чтобы проверить RPC (например, получить номер блока или chain_id)
-                    # Если RPC мертвый, тут вылетит ошибка, и мы перейдем к следующему
-                    temp_sender.w3.eth.get_block_number()
-
-                    sender = temp_sender
-                    break  # Если успешно, выходим из цикла перебора RPC
-                except Exception as e:
-                    logger.warning(f"RPC {current_url} не отвечает: {e}. Пробуем следующий...")
+            still_pending = reconcile(journal, rpc_pool)
+        except Exception as e:
+            # Статус неизвестен: все неподтверждённые транзакции перепроверит трекер
+            logger.warning(f"Не удалось перепроверить транзакции из журнала: {e}")
+            still_pending = journal.unconfirmed()
+        for address, hashes in still_pending.items():
+            for tx_hash in hashes:
+                tracker.track(tx_hash, address)
+        # Кошелёк завершён, когда в сети все его депозиты; кошельки с ожидающими транзакциями пропускаются
+        # (их баланс ещё не учитывает отправленное), остальным досылаются недостающие депозиты
+        deposits_sent = journal.deposits_sent()
+        done = {address for address, count in deposits_sent.items() if count >= tx_per_wallet} | set(still_pending)
+        sent = {address: count for address, count in deposits_sent.items() if address not in done}
+        wallet_keys = [key for key in wallet_keys if addresses[key] not in done]
+        logger.info(f"Уже обработано кошельков: {len(private_keys) - len(wallet_keys)}, "
+                    f"осталось: {len(wallet_keys)} (из них с частью депозитов: {len(sent)})")
+
+    # Выполнение плана из --simulate: quote и оценки газа уже в плане
+    if plan is not None:
+        execute_plan(plan, wallet_keys, addresses, input_chain, rpc_pool, fee_oracle, tracker, journal,
+                     signer=signer, delay=(min_delay, max_delay), sent=sent)
+        logger.success("План выполнен. Завершение работы.")
+        return
 
+    # Предварительная проверка: балансы всех кошельков пакетами, «пыль» отсеивается до запросов к Gas.zip,
+    # годные кошельки обрабатываются по убыванию баланса
+    if config.get('PRESCAN', True) and wallet_keys:
+        threshold = prescan_threshold(rpc_pool, fee_oracle, input_chain, tx_per_wallet)
+        triage = prescan(rpc_pool, {key: addresses[key] for key in wallet_keys}, threshold)
+        log_triage(triage, threshold, input_chain.decimals, input_chain.symbol)
+        if config.get('TRIAGE_REPORT'):
+            write_triage_report(triage, Path(config.TRIAGE_REPORT), input_chain.decimals)
+        wallet_keys = [wallet.private_key for wallet in triage if wallet.status in ('ready', 'unknown')]
+
+    # Асинхронный режим: кошельки обрабатываются параллельно вместо последовательного цикла
+    if config.get('ASYNC_MODE', False):
+        concurrency = int(config.get('CONCURRENCY', 10))
+        start_jitter = float(config.get('START_JITTER', 0))
+        logger.info(f"Асинхронный режим: параллельность {concurrency}, смещение старта до {start_jitter} с.")
+        asyncio.run(run_async(wallet_keys, input_chain, routes, rpc_pool, amount_out,
+                              concurrency=concurrency, start_jitter=start_jitter, deposits=deposits,
+                              tracker=tracker, journal=journal, signer=signer, fee_oracle=fee_oracle,
+                              sent=sent))
+        logger.success("Все кошельки успешно обработаны. Завершение работы.")
+        return
+
+    # 4. Основной цикл по кошелькам
+    for i, private_key in enumerate(wallet_keys):
+        wallet_started = time.monotonic()
+        try:
+            # Берём RPC из общего пула, начиная с лучшего; упавшие RPC уходят на паузу
+            sender = connect_sender(private_key, rpc_pool, input_chain, fee_oracle, signer)
             if sender is None:
                 logger.error(f"Не удалось подключиться ни к одному RPC для сети {input_chain.name}")
                 continue
 
-            logger.info(f"[{i + 1}/{len(private_keys)}] Работаем с кошельком: {sender.address}")
+            logger.info(f"[{i + 1}/{len(wallet_keys)}] Работаем с кошельком: {sender.address}")
             logger.info(f"Баланс: {sender.w3.from_wei(sender.balance, 'ether')} {input_chain.symbol}")
 
             # 5. проверка минимального баланса
@@ -93,30 +291,28 @@ def main():
                 num = random.uniform(amount_out[0], amount_out[1])
                 preliminary_amount = round(num, 6)
 
-            # 6. Предварительный расчет: сначала запрашиваем quote для почти полного баланса
-            quote_data = get_quote(input_chain, output_chain, preliminary_amount, sender.address, sender.address)
-            if quote_data is None:
+            # 6. Предварительный расчет: шаблон депозитной транзакции для пары сетей (из кэша,
+            # либо quote для почти полного баланса, если шаблона ещё нет)
+            template = deposit_template(input_chain, output_chain, preliminary_amount, sender.address)
+            if template is None:
                 logger.error("Не удалось получить quote от API. Пропускаем кошелек.")
                 continue
 
-
-            # 7. Оцениваем точную стоимость газа из quote
+            # 7. Оцениваем точную стоимость газа по шаблону
             try:
-                gas_estimate = sender.w3.eth.estimate_gas({
-                    'from': sender.address,
-                    'to': sender.w3.to_checksum_address(quote_data.contractDepositTxn.to),
-                    'value': int(quote_data.contractDepositTxn.value, 16),
-                    'data': quote_data.contractDepositTxn.data,
-                })
-
-                # Получаем текущую цену газа
-                latest_block = sender.w3.eth.get_block('latest')
-                base_fee = latest_block['baseFeePerGas']
-                max_priority_fee = sender.w3.eth.max_priority_fee
-                max_fee = int(base_fee * 1.25 + max_priority_fee)
-
-                # Рассчитываем максимальную стоимость газа с запасом 25%
-                max_gas_cost = int(gas_estimate * 1.25) * max_fee
+                with metrics.span('estimate', sender.address):
+                    gas_estimate = sender.w3.eth.estimate_gas({
+                        'from': sender.address,
+                        'to': sender.w3.to_checksum_address(template.to),
+                        'value': int(preliminary_amount),
+                        'data': template.data,
+                    })
+
+                # Текущая цена газа уже получена в snapshot кошелька
+                max_fee = sender.max_fee
+
+                # Рассчитываем максимальную стоимость газа с запасом 25% на все оставшиеся депозиты кошелька
+                max_gas_cost = int(gas_estimate * 1.25) * max_fee * (tx_per_wallet - sent.get(sender.address, 0))
 
                 # Вычисляем МАКСИМАЛЬНУЮ сумму для отправки
                 amount_to_send = sender.balance - max_gas_cost
@@ -130,31 +326,40 @@ def main():
                 logger.error(f"Ошибка при оценке газа: {e}. Пропускаем кошелек.")
                 continue
 
-            # 8. Проверка минимальной суммы
-            if amount_to_send < min_amount:
+            # 8. Проверка минимальной суммы (для каждого депозита)
+            planned = plan_deposits(amount_to_send, routes, deposits, sent.get(sender.address, 0))
+            deposit_amount = min(amount for _, amount in planned)
+            if deposit_amount < min_amount:
                 logger.warning(
-                    f"Сумма после вычета газа ({sender.w3.from_wei(amount_to_send, 'ether'):.6f}) "
+                    f"Сумма депозита после вычета газа ({sender.w3.from_wei(deposit_amount, 'ether'):.6f}) "
                     f"меньше минимально допустимой ({sender.w3.from_wei(min_amount, 'ether'):.6f}). Пропускаем.")
                 continue
 
-            # 9. Получаем ФИНАЛЬНЫЙ quote с точной суммой
-            final_quote = get_quote(input_chain, output_chain, amount_to_send, sender.address, sender.address)
-            if final_quote is None:
+            # 9. Получаем ФИНАЛЬНЫЕ quote с точной суммой (одинаковые суммы берутся из кэша)
+            final_quotes = [get_quote(input_chain, chain, amount, sender.address, sender.address)
+                            for chain, amount in planned]
+            if any(final_quote is None for final_quote in final_quotes):
                 logger.error("Не удалось получить финальный quote от API. Пропускаем кошелек.")
                 continue
+            journal.record(sender.address, 'quoted')
 
-            # 10. Отправка транзакции
-            tx_hash = sender.send_transaction(final_quote)
-            explorer_url = sender.input_chain.explorer.rstrip('/')
-            logger.success(f"Транзакция успешно отправлена! Эксплорер: {explorer_url}/tx/0x{tx_hash.hex()}")
+            # 10. Отправка депозитов подряд, чеки подтверждает фоновый трекер
+            sender.on_signed = lambda address, tx_hash: journal.record(address, 'signed', tx_hash)
+            tx_hashes = sender.send_transactions(final_quotes, gas_estimate=gas_estimate, wait=False)
+            for tx_hash in tx_hashes:
+                journal.record(sender.address, 'broadcast', tx_hash.to_0x_hex())
+                tracker.track(tx_hash, sender.address, replace=sender.replace_transaction)
+                logger.success(f"Транзакция успешно отправлена! Эксплорер: {explorer_url}/tx/0x{tx_hash.hex()}")
 
         except ValueError as e:
             logger.error(f"Проблема с кошельком: {e}")
         except Exception as e:
             logger.error(f"Произошла непредвиденная ошибка: {e}")
+        finally:
+            metrics.observe('wallet', time.monotonic() - wallet_started, addresses.get(private_key))
 
         # 8. Логика задержки
-        if i < len(private_keys) - 1:
+        if i < len(wallet_keys) - 1:
             delay = random.randint(min_delay, max_delay)
             logger.info(f"Пауза. Ждем {delay} секунд перед следующим кошельком...")
             time.sleep(delay)
@@ -163,4 +368,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Перевод нативной валюты между сетями через Gas.zip")
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help="продолжить прерванный прогон из журнала (по умолчанию последний)")
+    parser.add_argument('--simulate', nargs='?', const='plan.json', metavar='PLAN',
+                        help="пробный прогон без отправки транзакций, план сохраняется в файл (по умолчанию plan.json)")
+    parser.add_argument('--plan', metavar='PLAN', help="выполнить план, сохранённый через --simulate")
+    args = parser.parse_args()
+    if args.simulate and args.plan:
+        parser.error("--simulate и --plan нельзя указывать вместе")
+    main(resume=args.resume, simulate_path=args.simulate, plan_path=args.plan)
\ No newline at end of file
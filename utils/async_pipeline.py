@@ -0,0 +1,170 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from eth_account import Account
+from loguru import logger
+
+from utils.blockchain import AsyncTransactionSender
+from utils.config import transport
+from utils.fee_oracle import FeeOracle, make_fee_oracle
+from utils.journal import RunJournal
+from utils.metrics import metrics
+from utils.nonce_manager import NonceManager
+from utils.models import Chain
+from utils.functions import async_deposit_template, async_get_quote, plan_deposits
+from utils.receipt_tracker import ReceiptTracker
+from utils.rpc_pool import RpcPool
+from utils.signer import KeySigner
+
+
+async def connect_sender(session: aiohttp.ClientSession, private_key: str, rpc_pool: RpcPool,
+                         input_chain: Chain, fee_oracle: FeeOracle, signer: Optional[KeySigner] = None,
+                         nonce_manager: Optional[NonceManager] = None) -> Optional[AsyncTransactionSender]:
+    """
+    Перебирает RPC из общего пула, начиная с лучшего, и возвращает отправителя для первого рабочего.
+    :return: AsyncTransactionSender или None, если ни один RPC не ответил
+    """
+    # Ключ проверяется до перебора RPC: ValueError здесь — некорректный ключ, а любая ошибка
+    # при подключении (в том числе JSONDecodeError и Web3ValueError) — проблема RPC
+    signer.address(private_key) if signer else Account.from_key(private_key)
+    started = time.monotonic()
+    sender = await rpc_pool.async_with_failover(lambda endpoint: AsyncTransactionSender.create(
+        private_key, endpoint.url, input_chain, fee_oracle, session, signer, nonce_manager))
+    if sender is not None:
+        metrics.observe('connect', time.monotonic() - started, sender.address)
+    return sender
+
+
+async def process_wallet(session: aiohttp.ClientSession, index: int, total: int, private_key: str,
+                         input_chain: Chain, routes: List[Tuple[Chain, float]], rpc_pool: RpcPool,
+                         fee_oracle: FeeOracle,
+                         amount_out, deposits: int = 1, tracker: Optional[ReceiptTracker] = None,
+                         journal: Optional[RunJournal] = None, signer: Optional[KeySigner] = None,
+                         nonce_manager: Optional[NonceManager] = None, sent: Optional[Dict[str, int]] = None) -> bool:
+    """
+    Полный цикл обработки одного кошелька: RPC, баланс, quote, оценка газа, отправка.
+    :param routes: Маршруты депозитов (сеть, доля суммы), см. build_routes
+    :param nonce_manager: Менеджер nonce входной сети (нужен свой для каждой сети, если кошелёк работает в нескольких)
+    :param sent: {адрес: сколько транзакций уже отправлено} для кошельков, обработанных не до конца
+    :return: True, если все транзакции отправлены
+    """
+    sender = await connect_sender(session, private_key, rpc_pool, input_chain, fee_oracle, signer, nonce_manager)
+    if sender is None:
+        logger.error(f"[{index}/{total}] Не удалось подключиться ни к одному RPC для сети {input_chain.name}")
+        return False
+
+    prefix = f"[{index}/{total}] {sender.address}"
+    already_sent = (sent or {}).get(sender.address, 0)
+    logger.info(f"{prefix} Баланс: {sender.w3.from_wei(sender.balance, 'ether')} {input_chain.symbol}")
+
+    min_amount = int(input_chain.minOutboundNative)
+    preliminary_amount = int(sender.balance * 0.95)
+    if amount_out:
+        preliminary_amount = round(random.uniform(amount_out[0], amount_out[1]), 6)
+
+    template = await async_deposit_template(session, input_chain, routes[0][0], preliminary_amount, sender.address)
+    if template is None:
+        logger.error(f"{prefix} Не удалось получить quote от API. Пропускаем кошелек.")
+        return False
+
+    try:
+        with metrics.span('estimate', sender.address):
+            gas_estimate = await sender.w3.eth.estimate_gas({
+                'from': sender.address,
+                'to': sender.w3.to_checksum_address(template.to),
+                'value': int(preliminary_amount),
+                'data': template.data,
+            })
+        max_gas_cost = int(gas_estimate * 1.25) * sender.max_fee * (deposits * len(routes) - already_sent)
+        amount_to_send = sender.balance - max_gas_cost
+        logger.info(f"{prefix} Оценка газа: {sender.w3.from_wei(max_gas_cost, 'ether')} {input_chain.symbol}, "
+                    f"к отправке: {sender.w3.from_wei(amount_to_send, 'ether')} {input_chain.symbol}")
+    except Exception as e:
+        logger.error(f"{prefix} Ошибка при оценке газа: {e}. Пропускаем кошелек.")
+        return False
+
+    planned = plan_deposits(amount_to_send, routes, deposits, already_sent)
+    deposit_amount = min(amount for _, amount in planned)
+    if deposit_amount < min_amount:
+        logger.warning(
+            f"{prefix} Сумма депозита после вычета газа ({sender.w3.from_wei(deposit_amount, 'ether'):.6f}) "
+            f"меньше минимально допустимой ({sender.w3.from_wei(min_amount, 'ether'):.6f}). Пропускаем.")
+        return False
+
+    final_quotes = [await async_get_quote(session, input_chain, chain, amount, sender.address, sender.address)
+                    for chain, amount in planned]
+    if any(final_quote is None for final_quote in final_quotes):
+        logger.error(f"{prefix} Не удалось получить финальный quote от API. Пропускаем кошелек.")
+        return False
+
+    if journal is not None:
+        journal.record(sender.address, 'quoted')
+        sender.on_signed = lambda address, tx_hash: journal.record(address, 'signed', tx_hash)
+
+    # С трекером чеки подтверждаются в фоне, иначе ждём их здесь
+    tx_hashes = await sender.send_transactions(final_quotes, gas_estimate=gas_estimate, wait=tracker is None)
+    explorer_url = input_chain.explorer.rstrip('/')
+    for tx_hash in tx_hashes:
+        if journal is not None:
+            journal.record(sender.address, 'broadcast' if tracker is not None else 'confirmed', tx_hash.to_0x_hex())
+        if tracker is not None:
+            tracker.track(tx_hash, sender.address, replace=sender.replace_from_thread)
+        logger.success(f"{prefix} Транзакция успешно отправлена! Эксплорер: {explorer_url}/tx/0x{tx_hash.hex()}")
+    return len(tx_hashes) == len(planned)
+
+
+async def run_async(private_keys, input_chain: Chain, routes: List[Tuple[Chain, float]], rpc_pool: RpcPool, amount_out,
+                    concurrency: int = 10, start_jitter: float = 0, deposits: int = 1,
+                    tracker: Optional[ReceiptTracker] = None, journal: Optional[RunJournal] = None,
+                    signer: Optional[KeySigner] = None, fee_oracle: Optional[FeeOracle] = None,
+                    sent: Optional[Dict[str, int]] = None) -> int:
+    """
+    Асинхронно обрабатывает все кошельки с ограничением параллельности.
+    Вместо общей паузы между кошельками каждый кошелёк стартует со случайным смещением 0..start_jitter секунд.
+    :param concurrency: Максимальное число одновременно обрабатываемых кошельков
+    :param start_jitter: Максимальное смещение старта кошелька в секундах
+    :param routes: Маршруты депозитов (сеть, доля суммы), см. build_routes
+    :param deposits: Сколько раз повторить депозиты по маршрутам с одного кошелька
+    :param tracker: Фоновый трекер чеков; без него каждый кошелёк ждёт свои чеки сам
+    :param journal: Журнал прогона для продолжения после падения
+    :param signer: Пул процессов для адресов и подписи транзакций
+    :param fee_oracle: Общий FeeOracle прогона (статистику по нему пишет вызывающий код)
+    :param sent: {адрес: сколько транзакций уже отправлено} для кошельков, обработанных не до конца
+    :return: Количество успешно отправленных транзакций
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    fee_oracle = fee_oracle or make_fee_oracle()
+    total = len(private_keys)
+    started = time.monotonic()
+
+    async with transport.async_session() as session:
+
+        async def worker(index: int, private_key: str) -> bool:
+            if start_jitter:
+                await asyncio.sleep(random.uniform(0, start_jitter))
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    return await process_wallet(session, index, total, private_key,
+                                                input_chain, routes, rpc_pool, fee_oracle, amount_out,
+                                                deposits, tracker, journal, signer, sent=sent)
+                except ValueError as e:
+                    logger.error(f"[{index}/{total}] Проблема с кошельком: {e}")
+                except Exception as e:
+                    logger.error(f"[{index}/{total}] Произошла непредвиденная ошибка: {e}")
+                finally:
+                    metrics.observe('wallet', time.monotonic() - started,
+                                    signer.known_address(private_key) if signer else None)
+                return False
+
+        results = await asyncio.gather(*(worker(i + 1, key) for i, key in enumerate(private_keys)))
+
+    elapsed = time.monotonic() - started
+    success = sum(results)
+    rate = total / elapsed * 60 if elapsed > 0 else 0.0
+    logger.info(f"Обработано кошельков: {total} (успешно: {success}) за {elapsed:.1f} с, "
+                f"скорость: {rate:.1f} кошельков/мин при параллельности {concurrency}")
+    return success
@@ -1,42 +1,88 @@
-from typing import Callable, Optional
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
-from box import Box
+import aiohttp
+from eth_account import Account
 from eth_typing import Hash32, HexStr
 from hexbytes import HexBytes
-from web3 import Web3
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import TimeExhausted
 from loguru import logger
 from web3.types import TxReceipt
 
+from utils.config import transport
+from utils.fee_oracle import FeeOracle
+from utils.metrics import metrics
+from utils.models import Chain, ContractDepositTxn, Quote
+from utils.functions import calc_max_fee
+from utils.nonce_manager import NonceManager, nonce_manager as default_nonce_manager
+from utils.rpc_batch import WalletSnapshot, async_fetch_snapshot, fetch_snapshot
+from utils.rpc_pool import RpcPool
+from utils.signer import KeySigner
+
+# Во сколько раз поднимать цену газа при замене зависшей транзакции (сеть требует минимум +10%)
+REPLACEMENT_BUMP = 1.125
+
+
+def _is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return 'nonce too low' in message or 'replacement transaction' in message
+
+
+def _is_already_known(error: Exception) -> bool:
+    """Узел уже держит в mempool эту же подписанную транзакцию (например, после повтора запроса)."""
+    return 'already known' in str(error).lower()
+
 
 class TransactionSender:
     """
     Класс для подготовки, проверки и отправки транзакции для одного кошелька.
+    Баланс, nonce и chain_id читаются одним пакетным запросом (snapshot), параметры газа берутся
+    из общего FeeOracle; snapshot используется как при предварительной проверке, так и при отправке.
+    Nonce выдаёт NonceManager, поэтому несколько депозитов можно отправить подряд, не дожидаясь чеков.
+    Адрес берётся из заранее посчитанных KeySigner, если он передан.
     """
 
-    def __init__(self, private_key: str, rpc: str, input_chain: Box):
+    def __init__(self, private_key: str, rpc: str, input_chain: Chain, fee_oracle: Optional[FeeOracle] = None,
+                 nonce_manager: Optional[NonceManager] = None, signer: Optional[KeySigner] = None):
         self.private_key = private_key
-        self.w3 = Web3(Web3.HTTPProvider(rpc))
-        self.address = self.w3.to_checksum_address(self.w3.eth.account.from_key(private_key).address)
-        self.balance = self.w3.eth.get_balance(self.address)
+        self.signer = signer
+        self.w3 = Web3(transport.http_provider(rpc))
+        self.address = self._derive_address(private_key)
+        self.fee_oracle = fee_oracle or FeeOracle()
+        self.nonce_manager = nonce_manager or default_nonce_manager
+        self.snapshot: WalletSnapshot = fetch_snapshot(self.w3, self.address, self.fee_oracle)
+        self.nonce_manager.sync(self.address, self.snapshot.nonce)
+        self.balance = self.snapshot.balance
         self._quote = None
         self.input_chain = input_chain  # Сохраняем для ссылки на эксплорер
+        self.pending: Dict[HexBytes, dict] = {}  # отправленные, но не подтверждённые транзакции
+        self.on_signed: Optional[Callable[[str, str], None]] = None  # (адрес, хэш) до отправки в сеть, для журнала
+
+    def _derive_address(self, private_key: str) -> str:
+        if self.signer is not None:
+            return self.signer.address(private_key)
+        return self.w3.to_checksum_address(self.w3.eth.account.from_key(private_key).address)
 
     @property
-    def quote(self) -> Box:
+    def quote(self) -> Quote:
         return self._quote
 
     @quote.setter
-    def quote(self, new_quote: Box):
+    def quote(self, new_quote: Quote):
         """Сеттер для атрибута quote с проверкой."""
         if new_quote is None:
             raise ValueError("Quote не может быть пустым (None)")
         self._quote = new_quote
 
-    def send_transaction(self, quote_data: Optional[Box] = None) -> HexBytes:
-        """
-        Собирает, проверяет, подписывает и отправляет транзакцию.
-        Возвращает хэш транзакции в случае успеха.
-        """
+    @property
+    def max_fee(self) -> int:
+        """maxFeePerGas по данным snapshot."""
+        return calc_max_fee(self.snapshot.base_fee, self.snapshot.max_priority_fee)
+
+    def _use_quote(self, quote_data: Optional[Quote]) -> ContractDepositTxn:
         # Если передали новые данные, сохраняем их
         if quote_data:
             self.quote = quote_data
@@ -44,42 +90,306 @@ class TransactionSender:
         # Проверяем, есть ли данные для транзакции
         if self._quote is None:
             raise ValueError("Нет данных quote для отправки транзакции!")
+        return self._quote.contractDepositTxn
 
-        contractDepositTxn = self._quote.contractDepositTxn
-
-        # 1. Получаем актуальные параметры газа (EIP-1559)
-        latest_block = self.w3.eth.get_block('latest')
-        base_fee = latest_block['baseFeePerGas']
-        max_priority_fee_per_gas = self.w3.eth.max_priority_fee
-        max_fee_per_gas = int(base_fee * 1.25 + max_priority_fee_per_gas)
-
-        # 2. Формируем базовые параметры транзакции
-        tx_params = {
+    def _build_tx(self, contractDepositTxn: ContractDepositTxn) -> dict:
+        """Параметры EIP-1559 транзакции из quote и snapshot, без nonce и лимита газа."""
+        return {
             'type': '0x2',
             'from': self.address,
             'to': self.w3.to_checksum_address(contractDepositTxn.to),
             'value': int(contractDepositTxn.value, 16),
             'data': contractDepositTxn.data,
-            'nonce': self.w3.eth.get_transaction_count(self.address),
-            'chainId': self.w3.eth.chain_id,
-            'maxPriorityFeePerGas': max_priority_fee_per_gas,
-            'maxFeePerGas': max_fee_per_gas
+            'chainId': self.snapshot.chain_id,
+            'maxPriorityFeePerGas': self.snapshot.max_priority_fee,
+            'maxFeePerGas': self.max_fee
         }
 
-        # 3. Надёжно оцениваем газ с запасом и обработкой ошибок
+    def _sign(self, tx_params: dict):
+        with metrics.span('sign', self.address):
+            signed_tx = self.w3.eth.account.sign_transaction(tx_params, self.private_key)
+        if self.on_signed is not None:
+            self.on_signed(self.address, signed_tx.hash.to_0x_hex())
+        return signed_tx
+
+    @staticmethod
+    def _bump_fees(tx_params: dict) -> dict:
+        """Копия транзакции с поднятой ценой газа для замены по тому же nonce."""
+        replacement = dict(tx_params)
+        replacement['maxPriorityFeePerGas'] = int(tx_params['maxPriorityFeePerGas'] * REPLACEMENT_BUMP) + 1
+        replacement['maxFeePerGas'] = int(tx_params['maxFeePerGas'] * REPLACEMENT_BUMP) + 1
+        return replacement
+
+    def _prepare(self, quote_data: Optional[Quote], gas_estimate: Optional[int]) -> dict:
+        tx_params = self._build_tx(self._use_quote(quote_data))
+
+        # Надёжно оцениваем газ с запасом и обработкой ошибок
+        if gas_estimate is None:
+            try:
+                gas_estimate = self.w3.eth.estimate_gas(tx_params)
+            except Exception as e:
+                logger.error(f"Ошибка при оценке газа: {e}")
+                raise ValueError("Не удалось оценить газ, транзакция не будет отправлена.")
+        tx_params['gas'] = int(gas_estimate * 1.25)  # Добавляем запас 25%
+        logger.info(f"Оценка газа: {gas_estimate}, с запасом: {tx_params['gas']}")
+        return tx_params
+
+    def _broadcast(self, tx_params: dict) -> HexBytes:
+        """Подписывает и отправляет транзакцию; nonce выдаётся локально, при ошибке возвращается."""
+        if 'nonce' not in tx_params:
+            tx_params['nonce'] = self.nonce_manager.allocate(self.address)
+        signed_tx = None
         try:
-            gas_estimate = self.w3.eth.estimate_gas(tx_params)
-            tx_params['gas'] = int(gas_estimate * 1.25)  # Добавляем запас 25%
-            logger.info(f"Оценка газа: {gas_estimate}, с запасом: {tx_params['gas']}")
+            signed_tx = self._sign(tx_params)
+            with metrics.span('broadcast', self.address):
+                tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
         except Exception as e:
-            logger.error(f"Ошибка при оценке газа: {e}")
-            raise ValueError("Не удалось оценить газ, транзакция не будет отправлена.")
+            if signed_tx is not None and _is_already_known(e):
+                # Транзакция уже отправлена: nonce занят ею, дальше она отслеживается как обычно
+                tx_hash = HexBytes(signed_tx.hash)
+                self.pending[tx_hash] = tx_params
+                return tx_hash
+            if _is_nonce_error(e):
+                self.nonce_manager.reset(self.address, self.w3.eth.get_transaction_count(self.address, 'pending'))
+            else:
+                self.nonce_manager.release(self.address, tx_params['nonce'])
+            raise
+        self.pending[tx_hash] = tx_params
+        return tx_hash
+
+    def replace_transaction(self, tx_hash: HexBytes) -> HexBytes:
+        """Заменяет зависшую транзакцию той же транзакцией с тем же nonce и более высокой ценой газа."""
+        replacement = self._bump_fees(self.pending.pop(tx_hash))
+        signed_tx = self._sign(replacement)
+        new_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        self.pending[new_hash] = replacement
+        logger.warning(f"Транзакция 0x{tx_hash.hex()} (nonce {replacement['nonce']}) заменена на 0x{new_hash.hex()}")
+        return new_hash
 
-        # 5. Подпись и отправка
-        signed_tx = self.w3.eth.account.sign_transaction(tx_params, self.private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    def wait_for_receipt(self, tx_hash: HexBytes, timeout: float = 120, replace: bool = True) -> TxReceipt:
+        """Ждёт чек транзакции; если она зависла, один раз заменяет её с поднятой ценой газа."""
+        try:
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        except TimeExhausted:
+            if not replace or tx_hash not in self.pending:
+                raise
+            tx_hash = self.replace_transaction(tx_hash)
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        self.pending.pop(tx_hash, None)
+        return receipt
+
+    def send_transaction(self, quote_data: Optional[Quote] = None, gas_estimate: Optional[int] = None,
+                         wait: bool = True) -> HexBytes:
+        """
+        Собирает, проверяет, подписывает и отправляет транзакцию.
+        Возвращает хэш транзакции в случае успеха.
+        :param gas_estimate: Оценка газа из предварительной проверки; если не задана, газ оценивается заново
+        :param wait: Ждать ли чек транзакции
+        """
+        tx_hash = self._broadcast(self._prepare(quote_data, gas_estimate))
 
         # Ждем чека, чтобы убедиться, что транзакция ушла в блокчейн
-        self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if wait:
+            tx_hash = self.wait_for_receipt(tx_hash)['transactionHash']
+
+        return tx_hash
+
+    def send_transactions(self, quotes: List[Quote], gas_estimate: Optional[int] = None,
+                          timeout: float = 120, wait: bool = True) -> List[HexBytes]:
+        """
+        Отправляет несколько депозитов подряд с последовательными nonce, затем параллельно ждёт все чеки.
+        Если отправка одного депозита не удалась, следующие не отправляются (иначе они зависнут за дырой в nonce).
+        :param wait: Ждать ли чеки (без ожидания хэши обычно передаются в ReceiptTracker)
+        :return: Хэши подтверждённых транзакций (с учётом замен) или отправленных, если wait=False
+        """
+        tx_hashes = []
+        for quote_data in quotes:
+            try:
+                tx_hashes.append(self.send_transaction(quote_data, gas_estimate, wait=False))
+            except Exception as e:
+                logger.error(f"Не удалось отправить депозит {len(tx_hashes) + 1}/{len(quotes)}: {e}")
+                break
+        if not wait:
+            return tx_hashes
+
+        confirmed = []
+        with ThreadPoolExecutor(max_workers=max(len(tx_hashes), 1)) as executor:
+            futures = [executor.submit(self.wait_for_receipt, tx_hash, timeout) for tx_hash in tx_hashes]
+            for tx_hash, future in zip(tx_hashes, futures):
+                try:
+                    confirmed.append(future.result()['transactionHash'])
+                except Exception as e:
+                    logger.error(f"Не дождались чека транзакции 0x{tx_hash.hex()}: {e}")
+        return confirmed
+
+
+def connect_sender(private_key: str, rpc_pool: RpcPool, input_chain: Chain, fee_oracle: FeeOracle,
+                   signer: Optional[KeySigner] = None) -> Optional[TransactionSender]:
+    """
+    Перебирает RPC из общего пула, начиная с лучшего, и возвращает отправителя для первого рабочего.
+    Ключ проверяется до перебора RPC: ValueError здесь — некорректный ключ, а любая ошибка
+    при подключении (в том числе JSONDecodeError и Web3ValueError) — проблема RPC.
+    :return: TransactionSender или None, если ни один RPC не ответил
+    """
+    signer.address(private_key) if signer else Account.from_key(private_key)
+    started = time.monotonic()
+    sender = rpc_pool.with_failover(
+        lambda endpoint: TransactionSender(private_key, endpoint.url, input_chain, fee_oracle, signer=signer))
+    if sender is not None:
+        metrics.observe('connect', time.monotonic() - started, sender.address)
+    return sender
+
+
+class AsyncTransactionSender(TransactionSender):
+    """
+    Асинхронный вариант TransactionSender на базе AsyncWeb3.
+    Создаётся через AsyncTransactionSender.create(), так как snapshot запрашивается по сети.
+    С KeySigner транзакции подписываются в пуле процессов, не блокируя цикл событий.
+    """
+
+    def __init__(self, private_key: str, rpc: str, input_chain: Chain, fee_oracle: Optional[FeeOracle] = None,
+                 provider: Optional[AsyncWeb3.AsyncHTTPProvider] = None,
+                 nonce_manager: Optional[NonceManager] = None, signer: Optional[KeySigner] = None):
+        self.private_key = private_key
+        self.signer = signer
+        self.rpc = rpc
+        self.w3 = AsyncWeb3(provider or AsyncWeb3.AsyncHTTPProvider(rpc))
+        self.address = self._derive_address(private_key)
+        self.fee_oracle = fee_oracle or FeeOracle()
+        self.nonce_manager = nonce_manager or default_nonce_manager
+        self.snapshot: Optional[WalletSnapshot] = None
+        self.balance = None
+        self._quote = None
+        self.input_chain = input_chain
+        self.pending: Dict[HexBytes, dict] = {}
+        self.on_signed: Optional[Callable[[str, str], None]] = None
+
+    @classmethod
+    async def create(cls, private_key: str, rpc: str, input_chain: Chain, fee_oracle: Optional[FeeOracle] = None,
+                     session: Optional[aiohttp.ClientSession] = None, signer: Optional[KeySigner] = None,
+                     nonce_manager: Optional[NonceManager] = None) -> "AsyncTransactionSender":
+        """
+        Создаёт отправителя и запрашивает snapshot кошелька.
+        :param session: Общая aiohttp-сессия транспорта (без неё у провайдера будет своя)
+        :param signer: Пул процессов для адресов и подписи
+        :param nonce_manager: Менеджер nonce сети (по умолчанию общий)
+        """
+        provider = await transport.async_http_provider(rpc, session) if session else None
+        sender = cls(private_key, rpc, input_chain, fee_oracle, provider, nonce_manager=nonce_manager, signer=signer)
+        sender.snapshot = await async_fetch_snapshot(sender.w3, sender.address, sender.fee_oracle)
+        sender.nonce_manager.sync(sender.address, sender.snapshot.nonce)
+        sender.balance = sender.snapshot.balance
+        return sender
+
+    async def _prepare(self, quote_data: Optional[Quote], gas_estimate: Optional[int]) -> dict:
+        tx_params = self._build_tx(self._use_quote(quote_data))
+
+        if gas_estimate is None:
+            try:
+                gas_estimate = await self.w3.eth.estimate_gas(tx_params)
+            except Exception as e:
+                logger.error(f"Ошибка при оценке газа: {e}")
+                raise ValueError("Не удалось оценить газ, транзакция не будет отправлена.")
+        tx_params['gas'] = int(gas_estimate * 1.25)
+        logger.info(f"Оценка газа: {gas_estimate}, с запасом: {tx_params['gas']}")
+        return tx_params
+
+    async def _async_sign(self, tx_params: dict):
+        if self.signer is None:
+            return self._sign(tx_params)
+        with metrics.span('sign', self.address):
+            signed_tx = await self.signer.async_sign(tx_params, self.private_key)
+        if self.on_signed is not None:
+            self.on_signed(self.address, signed_tx.hash.to_0x_hex())
+        return signed_tx
+
+    async def _broadcast(self, tx_params: dict) -> HexBytes:
+        if 'nonce' not in tx_params:
+            tx_params['nonce'] = self.nonce_manager.allocate(self.address)
+        signed_tx = None
+        try:
+            signed_tx = await self._async_sign(tx_params)
+            with metrics.span('broadcast', self.address):
+                tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception as e:
+            if signed_tx is not None and _is_already_known(e):
+                tx_hash = HexBytes(signed_tx.hash)
+                self.pending[tx_hash] = tx_params
+                return tx_hash
+            if _is_nonce_error(e):
+                self.nonce_manager.reset(self.address,
+                                         await self.w3.eth.get_transaction_count(self.address, 'pending'))
+            else:
+                self.nonce_manager.release(self.address, tx_params['nonce'])
+            raise
+        self.pending[tx_hash] = tx_params
+        return tx_hash
+
+    async def replace_transaction(self, tx_hash: HexBytes) -> HexBytes:
+        replacement = self._bump_fees(self.pending.pop(tx_hash))
+        signed_tx = await self._async_sign(replacement)
+        new_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        self.pending[new_hash] = replacement
+        logger.warning(f"Транзакция 0x{tx_hash.hex()} (nonce {replacement['nonce']}) заменена на 0x{new_hash.hex()}")
+        return new_hash
+
+    def replace_from_thread(self, tx_hash: HexBytes) -> HexBytes:
+        """
+        Синхронная замена зависшей транзакции для ReceiptTracker. Поток трекера не связан с циклом событий
+        (и работает после его завершения), поэтому замена подписывается в текущем процессе
+        и отправляется через синхронный Web3 того же RPC.
+        """
+        replacement = self._bump_fees(self.pending.pop(tx_hash))
+        signed_tx = self._sign(replacement)
+        new_hash = Web3(transport.http_provider(self.rpc)).eth.send_raw_transaction(signed_tx.raw_transaction)
+        self.pending[new_hash] = replacement
+        logger.warning(f"Транзакция 0x{tx_hash.hex()} (nonce {replacement['nonce']}) заменена на 0x{new_hash.hex()}")
+        return new_hash
+
+    async def wait_for_receipt(self, tx_hash: HexBytes, timeout: float = 120, replace: bool = True) -> TxReceipt:
+        try:
+            receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        except TimeExhausted:
+            if not replace or tx_hash not in self.pending:
+                raise
+            tx_hash = await self.replace_transaction(tx_hash)
+            receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        self.pending.pop(tx_hash, None)
+        return receipt
+
+    async def send_transaction(self, quote_data: Optional[Quote] = None, gas_estimate: Optional[int] = None,
+                               wait: bool = True) -> HexBytes:
+        """
+        Асинхронно собирает, подписывает и отправляет транзакцию.
+        Возвращает хэш транзакции в случае успеха.
+        """
+        tx_hash = await self._broadcast(await self._prepare(quote_data, gas_estimate))
+
+        # Ждем чека, не блокируя остальные кошельки
+        if wait:
+            tx_hash = (await self.wait_for_receipt(tx_hash))['transactionHash']
+
+        return tx_hash
+
+    async def send_transactions(self, quotes: List[Quote], gas_estimate: Optional[int] = None,
+                                timeout: float = 120, wait: bool = True) -> List[HexBytes]:
+        """Асинхронный вариант send_transactions: депозиты подряд, чеки ждём одновременно."""
+        tx_hashes = []
+        for quote_data in quotes:
+            try:
+                tx_hashes.append(await self.send_transaction(quote_data, gas_estimate, wait=False))
+            except Exception as e:
+                logger.error(f"Не удалось отправить депозит {len(tx_hashes) + 1}/{len(quotes)}: {e}")
+                break
+        if not wait:
+            return tx_hashes
 
-        return tx_hash
\ No newline at end of file
+        results = await asyncio.gather(*(self.wait_for_receipt(tx_hash, timeout) for tx_hash in tx_hashes),
+                                       return_exceptions=True)
+        confirmed = []
+        for tx_hash, result in zip(tx_hashes, results):
+            if isinstance(result, Exception):
+                logger.error(f"Не дождались чека транзакции 0x{tx_hash.hex()}: {result}")
+            else:
+                confirmed.append(result['transactionHash'])
+        return confirmed
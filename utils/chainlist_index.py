@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from utils.models import ChainRpc, rpc_list_adapter
+
+
+class ChainlistIndex:
+    """
+    Индекс chain_list.json в SQLite: chainId -> список RPC.
+    Индекс строится один раз при обновлении кэша Chainlist, после чего поиск RPC сети — это один запрос
+    по первичному ключу без разбора всего JSON. Ничего не читается до первого обращения.
+    """
+
+    def __init__(self, json_path: Path = Path(__file__).parent / 'chain_list.json',
+                 index_path: Path = Path(__file__).parent / 'chain_list.sqlite',
+                 refresh: Optional[Callable[[], bool]] = None):
+        """
+        :param json_path: Путь к кэшу Chainlist в JSON
+        :param index_path: Путь к индексу
+        :param refresh: Вызывается перед первым поиском, чтобы обновить устаревший кэш (должен вернуть False,
+            если данных нет)
+        """
+        self.json_path = Path(json_path)
+        self.index_path = Path(index_path)
+        self._refresh = refresh
+        self._ready = False
+        self._hot: Dict[int, Optional[List[ChainRpc]]] = {}  # в памяти только сети, которые уже искали
+        self._lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        """Индекс существует и не старше JSON-кэша."""
+        if not self.index_path.exists():
+            return False
+        if not self.json_path.exists():
+            return True
+        return self.index_path.stat().st_mtime >= self.json_path.stat().st_mtime
+
+    def build(self, chainlist_data: Optional[List[dict]] = None) -> int:
+        """
+        Строит индекс атомарно: во временный файл, затем замена.
+        :param chainlist_data: Уже загруженные данные Chainlist (если нет, читаются из JSON)
+        :return: Количество сетей в индексе
+        """
+        if chainlist_data is None:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                chainlist_data = json.load(f)
+
+        # Уникальное имя: индекс может перестраиваться и фоновой перепроверкой кэша
+        tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute("CREATE TABLE chains (chain_id INTEGER PRIMARY KEY, name TEXT, rpc TEXT NOT NULL)")
+            connection.executemany(
+                "INSERT OR REPLACE INTO chains VALUES (?, ?, ?)",
+                ((chain['chainId'], chain.get('name'), json.dumps(chain.get('rpc', []), separators=(',', ':')))
+                 for chain in chainlist_data if 'chainId' in chain))
+            connection.commit()
+            count = connection.execute("SELECT COUNT(*) FROM chains").fetchone()[0]
+        finally:
+            connection.close()
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"Индекс Chainlist построен: {count} сетей в {self.index_path}")
+        return count
+
+    def _ensure(self) -> bool:
+        with self._lock:
+            if self._ready:
+                return True
+            if self._refresh is not None and not self._refresh():
+                return False
+            if not self.is_fresh():
+                try:
+                    self.build()
+                except (OSError, ValueError, sqlite3.Error) as e:
+                    logger.error(f"Не удалось построить индекс Chainlist: {e}")
+                    return False
+            self._ready = True
+            return True
+
+    def rpc(self, chain_id: int) -> Optional[List[ChainRpc]]:
+        """Список RPC сети или None, если сеть не найдена."""
+        if chain_id in self._hot:
+            return self._hot[chain_id]
+        if not self._ensure():
+            return None
+        connection = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        try:
+            row = connection.execute("SELECT rpc FROM chains WHERE chain_id = ?", (chain_id,)).fetchone()
+        finally:
+            connection.close()
+        self._hot[chain_id] = rpc_list_adapter.validate_json(row[0]) if row else None
+        return self._hot[chain_id]
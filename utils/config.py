@@ -1,16 +1,13 @@
-import json
-import time
-
-import requests
 import yaml
 from box.box_list import BoxList
 from loguru import logger
 from typing import Dict, Optional
 from box import Box, BoxList, BoxError
 from pathlib import Path
-from requests import request
 
-from utils.decorator import retry
+from utils.chainlist_index import ChainlistIndex
+from utils.metadata_cache import MetadataCache
+from utils.transport import Transport
 
 """Открываем и читаем YAML файл"""
 def load_config() -> Optional[Dict]:
@@ -43,59 +40,29 @@ def open_private_key():
         return None
 
 
-@retry(max_attempts=3, delay=1)
-def make_request(method="GET", url=None, **kwargs):
-    response = requests.request(method=method, url=url, **kwargs)
-    response.raise_for_status()
-    return response
+CHAINLIST_URL = "https://chainlist.org/rpcs.json"
+# Кэш Chainlist хранится рядом с модулем, независимо от текущего каталога
+CHAINLIST_PATH = Path(__file__).parent / 'chain_list.json'
+CHAINLIST_INDEX_PATH = Path(__file__).parent / 'chain_list.sqlite'
 
 
-def load_or_fetch_chainlist_data(cache_duration_seconds: int = 86400) -> Optional[Box]:
+def refresh_chainlist_cache(cache_duration_seconds: int = 86400) -> bool:
     """
-    Загружает данные с Chainlist из локального кэша или скачивает их, если кэш устарел.
+    Проверяет кэш Chainlist условным запросом (ETag/Last-Modified) и перестраивает индекс по chainId,
+    если скачана новая версия. Устаревший кэш (до недели) используется сразу, перепроверка идёт в фоне.
     :param cache_duration_seconds: Время жизни кэша в секундах (по умолчанию 24 часа).
-    :return: Объект Box с данными или None в случае ошибки.
+    :return: True, если локальный кэш есть (свежий, обновлённый или устаревший, но пригодный).
     """
-    full_path = Path('utils/chain_list.json')
-    url = "https://chainlist.org/rpcs.json"
-
-    # Проверяем, нужно ли обновлять кэш
-    should_download = True
-    if full_path.exists():
-        file_mod_time = full_path.stat().st_mtime
-        if (time.time() - file_mod_time) < cache_duration_seconds:
-            logger.info("Используем локальный кэш Chainlist (файл свежий).")
-            should_download = False
-        else:
-            logger.info("Локальный кэш Chainlist устарел. Скачиваем свежую версию...")
-
-    if should_download:
-        try:
-            logger.info("Загружаем актуальный список сетей с Chainlist.org...")
-            chainlist_data = make_request(method="GET", url=url, timeout=20).json()
-
-            # ИСПРАВЛЕНИЕ: Создаем Box из словаря
-            with open(full_path, 'w', encoding='utf-8') as f:
-                json.dump(chainlist_data, f, indent=2, ensure_ascii=False)
+    return metadata_cache.ensure(
+        CHAINLIST_URL, CHAINLIST_PATH, ttl=cache_duration_seconds, max_stale=7 * 86400,
+        # Индекс строим из уже скачанных данных, не перечитывая файл
+        on_update=lambda chainlist_data: ChainlistIndex(CHAINLIST_PATH, CHAINLIST_INDEX_PATH).build(chainlist_data))
 
-            logger.success(f"Кэш Chainlist успешно сохранен в {full_path}")
-        except Exception as e:
-            logger.error(f"Не удалось скачать или сохранить данные с Chainlist: {e}")
-            # Если скачать не удалось, но старый файл есть, попробуем использовать его
-            if not full_path.exists():
-                return None
-
-    # Загружаем данные из файла
-    try:
-        # ИСПРАВЛЕНИЕ: Используем .from_file()
-        logger.info(f"Загружаем данные из файла {full_path}")
-        with open(full_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logger.error(f"Файл кэша {full_path} поврежден или не найден: {e}")
-        full_path.unlink(missing_ok=True)  # Удаляем битый файл
-        return None
 
 config = load_config()
+transport = Transport.from_config(config)
+# Кэш метаданных (Chainlist, список сетей Gas.zip) с условными запросами
+metadata_cache = MetadataCache(transport)
 private_keys = open_private_key()
-chains_list = BoxList(load_or_fetch_chainlist_data())
+# Chainlist не читается при импорте: кэш проверяется и индекс открывается при первом поиске сети
+chains_list = ChainlistIndex(CHAINLIST_PATH, CHAINLIST_INDEX_PATH, refresh=refresh_chainlist_cache)
@@ -1,12 +1,58 @@
+import asyncio
+import random
 import time
 from functools import wraps
+from typing import Optional
+
 from loguru import logger
 
-def retry(max_attempts=3, delay=1):
-    """Декоратор для повторных запросов.
+from utils.rate_limiter import parse_retry_after
+
+# HTTP-статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _status(error: Exception) -> Optional[int]:
+    """HTTP-статус из ошибки requests (error.response) или aiohttp (error.status)."""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status if status is not None else getattr(error, 'status', None)
+
+
+def _headers(error: Exception):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Можно ли повторить запрос после ошибки: 429/5xx/408 и сетевые ошибки — да,
+    прочие 4xx и ошибки разбора ответа — нет, повтор дал бы тот же результат.
+    """
+    status = _status(error)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUSES
+    return not isinstance(error, (ValueError, TypeError, KeyError))
+
+
+def backoff_delay(attempt: int, delay: float, max_delay: float, error: Optional[Exception] = None) -> float:
+    """
+    Пауза перед повтором: экспонента delay * 2^(attempt-1) не больше max_delay со случайным разбросом
+    (половина паузы фиксирована, половина случайна), но не меньше Retry-After из ответа.
+    """
+    cap = min(max_delay, delay * 2 ** (attempt - 1))
+    wait = cap / 2 + random.uniform(0, cap / 2)
+    retry_after = parse_retry_after(_headers(error).get('Retry-After')) if error is not None else None
+    return max(wait, retry_after or 0.0)
+
+
+def retry(max_attempts=3, delay=1, max_delay=30):
+    """Декоратор для повторных запросов с экспоненциальной паузой и разбросом.
+    Повторяются только ошибки, для которых is_retryable() вернул True.
     Args:
         max_attempts: Максимальное количество попыток (по умолчанию: 3).
-        delay: Задержка между попытками в секундах (по умолчанию: 1).
+        delay: Базовая задержка между попытками в секундах (по умолчанию: 1).
+        max_delay: Максимальная задержка между попытками в секундах (по умолчанию: 30).
     """
     def decorator(func):
         @wraps(func)
@@ -17,9 +63,40 @@ def retry(max_attempts=3, delay=1):
                     return func(*args, **kwargs)
                 except Exception as e:
                     last_error = e
+                    if not is_retryable(e):
+                        logger.error(f"Ошибка без повтора: {e}")
+                        return None
+                    logger.warning(f"Попытка {attempt}/{max_attempts} завершилась с ошибкой: {e}")
+                    if attempt < max_attempts:
+                        time.sleep(backoff_delay(attempt, delay, max_delay, e))
+            logger.error(f"Все {max_attempts} попыток исчерпаны. Последняя ошибка: {last_error}")
+            return None
+        return wrapper
+    return decorator
+
+
+def async_retry(max_attempts=3, delay=1, max_delay=30):
+    """Асинхронный вариант декоратора retry для корутин.
+    Args:
+        max_attempts: Максимальное количество попыток (по умолчанию: 3).
+        delay: Базовая задержка между попытками в секундах (по умолчанию: 1).
+        max_delay: Максимальная задержка между попытками в секундах (по умолчанию: 30).
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            last_error = None
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable(e):
+                        logger.error(f"Ошибка без повтора: {e}")
+                        return None
                     logger.warning(f"Попытка {attempt}/{max_attempts} завершилась с ошибкой: {e}")
                     if attempt < max_attempts:
-                        time.sleep(delay * attempt)
+                        await asyncio.sleep(backoff_delay(attempt, delay, max_delay, e))
             logger.error(f"Все {max_attempts} попыток исчерпаны. Последняя ошибка: {last_error}")
             return None
         return wrapper
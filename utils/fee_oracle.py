@@ -0,0 +1,134 @@
+import asyncio
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+from loguru import logger
+from web3 import AsyncWeb3, Web3
+
+from utils.config import config
+from utils.functions import calc_max_fee
+
+
+@dataclass(frozen=True)
+class FeeParams:
+    """Параметры газа EIP-1559 для одного блока."""
+    block_number: int
+    base_fee: int  # базовая комиссия следующего блока
+    priority_fees: Dict[int, int]  # перцентиль -> чаевые, медиана по последним блокам
+
+    def priority_fee(self, percentile: int) -> int:
+        return self.priority_fees[percentile]
+
+
+class FeeOracle:
+    """
+    Общий для всех кошельков кэш параметров газа одной сети.
+    Один запрос eth_feeHistory на блок: пока голова сети не сменилась, все кошельки получают значения из кэша.
+    """
+
+    def __init__(self, percentiles: Sequence[int] = (25, 50, 75), tip_percentile: int = 50,
+                 history_blocks: int = 5, head_check_interval: float = 1.0):
+        """
+        :param percentiles: Перцентили чаевых, запрашиваемые в eth_feeHistory
+        :param tip_percentile: Перцентиль чаевых по умолчанию
+        :param history_blocks: По скольким последним блокам усреднять чаевые
+        :param head_check_interval: Как часто проверять номер блока, если его не передали, в секундах
+        """
+        if tip_percentile not in percentiles:
+            percentiles = sorted({*percentiles, tip_percentile})
+        self.percentiles = list(percentiles)
+        self.tip_percentile = tip_percentile
+        self.history_blocks = history_blocks
+        self.head_check_interval = head_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._params: Optional[FeeParams] = None
+        self._head_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+
+    def _is_fresh(self, block_number: Optional[int]) -> bool:
+        if self._params is None:
+            return False
+        if block_number is None:
+            return time.monotonic() - self._head_checked_at < self.head_check_interval
+        return self._params.block_number >= block_number
+
+    def _parse(self, history, fallback_tip: Optional[int] = None) -> FeeParams:
+        oldest_block = history['oldestBlock']
+        rewards = history.get('reward') or []
+        priority_fees = {}
+        for i, percentile in enumerate(self.percentiles):
+            values = [block_rewards[i] for block_rewards in rewards if len(block_rewards) > i]
+            priority_fees[percentile] = int(statistics.median(values)) if values else 0
+        if fallback_tip is not None:
+            priority_fees = {percentile: tip or fallback_tip for percentile, tip in priority_fees.items()}
+        return FeeParams(block_number=oldest_block + len(history['baseFeePerGas']) - 2,
+                         base_fee=history['baseFeePerGas'][-1],
+                         priority_fees=priority_fees)
+
+    def _store(self, params: FeeParams) -> FeeParams:
+        self.misses += 1
+        self._params = params
+        self._head_checked_at = time.monotonic()
+        return params
+
+    def get(self, w3: Web3, block_number: Optional[int] = None) -> FeeParams:
+        """
+        Параметры газа для блока block_number (или текущей головы сети).
+        :param block_number: Номер блока, известный вызывающему (например, из snapshot кошелька)
+        """
+        with self._lock:
+            if self._is_fresh(block_number):
+                self.hits += 1
+                return self._params
+            if block_number is None:
+                block_number = w3.eth.block_number
+                self._head_checked_at = time.monotonic()
+                if self._is_fresh(block_number):
+                    self.hits += 1
+                    return self._params
+            history = w3.eth.fee_history(self.history_blocks, 'latest', self.percentiles)
+            params = self._parse(history)
+            if not params.priority_fee(self.tip_percentile):
+                # Пустые блоки: чаевые берём из eth_maxPriorityFeePerGas
+                params = self._parse(history, fallback_tip=w3.eth.max_priority_fee)
+            return self._store(params)
+
+    async def async_get(self, w3: AsyncWeb3, block_number: Optional[int] = None) -> FeeParams:
+        """Асинхронный вариант get; конкурентные запросы одного блока ждут один eth_feeHistory."""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._is_fresh(block_number):
+                self.hits += 1
+                return self._params
+            if block_number is None:
+                block_number = await w3.eth.block_number
+                self._head_checked_at = time.monotonic()
+                if self._is_fresh(block_number):
+                    self.hits += 1
+                    return self._params
+            history = await w3.eth.fee_history(self.history_blocks, 'latest', self.percentiles)
+            params = self._parse(history)
+            if not params.priority_fee(self.tip_percentile):
+                params = self._parse(history, fallback_tip=await w3.eth.max_priority_fee)
+            return self._store(params)
+
+    def max_fee(self, params: FeeParams, percentile: Optional[int] = None) -> int:
+        """maxFeePerGas для выбранного перцентиля чаевых."""
+        return calc_max_fee(params.base_fee, params.priority_fee(percentile or self.tip_percentile))
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        logger.info(f"FeeOracle: запросов {total}, из кэша {self.hits} ({hit_rate:.0f}%), "
+                    f"запросов eth_feeHistory {self.misses}")
+
+
+def make_fee_oracle() -> FeeOracle:
+    """FeeOracle входной сети с перцентилем чаевых из PRIORITY_FEE_PERCENTILE."""
+    return FeeOracle(tip_percentile=int(config.get('PRIORITY_FEE_PERCENTILE', 50)))
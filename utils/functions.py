@@ -1,9 +1,37 @@
+import asyncio
+import hashlib
 from loguru import logger
-from box import Box, BoxList
-from utils.config import config
-from typing import Optional, Tuple
-from utils.decorator import retry
+from utils.chainlist_index import ChainlistIndex
+from utils.config import config, chains_list, metadata_cache, transport
+from typing import Dict, List, Optional, Tuple, Type
+from pathlib import Path
+from utils.decorator import retry, async_retry
+from utils.metrics import metrics
+from utils.models import Chain, ChainList, ChainRpc, ContractDepositTxn, Quote
+from utils.quote_cache import QuoteCache
+import aiohttp
 import requests
+from pydantic import BaseModel
+
+# Базовый адрес API Gas.zip (можно переопределить в setting.yaml, например, на локальную заглушку)
+DEFAULT_GAS_ZIP_API = "https://backend.gas.zip"
+GAS_ZIP_API = (config or {}).get('GAS_ZIP_API', DEFAULT_GAS_ZIP_API).rstrip('/')
+
+
+def gas_zip_chains_path(api: str) -> Path:
+    """
+    Локальная копия списка сетей Gas.zip (перепроверяется условным запросом), рядом с модулем.
+    У каждого адреса API своя копия: заглушка бенчмарка не перезаписывает список сетей настоящего API.
+    """
+    if api == DEFAULT_GAS_ZIP_API:
+        return Path(__file__).parent / 'gas_zip_chains.json'
+    return Path(__file__).parent / f"gas_zip_chains-{hashlib.sha1(api.encode('utf-8')).hexdigest()[:8]}.json"
+
+
+GAS_ZIP_CHAINS_PATH = gas_zip_chains_path(GAS_ZIP_API)
+
+# Общий кэш quote и шаблонов депозитной транзакции
+quote_cache = QuoteCache(ttl=float((config or {}).get('QUOTE_TTL', 30)))
 
 def check_load_configuration(config, private_keys, chains_list):
     if config is None or private_keys is None or chains_list is None:
@@ -16,45 +44,136 @@ def check_load_configuration(config, private_keys, chains_list):
         return False
     return True
 
-def search_two_chain(data: Box) -> Tuple[Optional[Box], Optional[Box]]:
+def load_support_chains() -> Optional[ChainList]:
+    """
+    Список сетей Gas.zip из кэша метаданных: свежая копия (CHAINS_CACHE_TTL) используется без запроса,
+    устаревшая перепроверяется по ETag/Last-Modified, при недоступном API берётся последняя сохранённая.
+    """
+    data = metadata_cache.get(f"{GAS_ZIP_API}/v2/chains", GAS_ZIP_CHAINS_PATH,
+                              ttl=float(config.get('CHAINS_CACHE_TTL', 600)), max_stale=86400, timeout=10,
+                              parse=ChainList.model_validate_json)
+    return data
+
+def index_chains(data: ChainList) -> Dict[str, Chain]:
+    """Индекс поддерживаемых сетей Gas.zip по названию."""
+    return {chain.name: chain for chain in data.chains}
+
+def parse_output_chains(setting) -> List[Tuple[str, float]]:
+    """
+    Выходные сети из OUTPUT_CHAIN: название, названия через запятую, список названий или {название: вес}.
+    :return: Список (название сети, вес)
+    """
+    if isinstance(setting, str):
+        return [(name.strip(), 1.0) for name in setting.split(',') if name.strip()]
+    if isinstance(setting, dict):
+        return [(str(name), float(weight)) for name, weight in setting.items() if float(weight) > 0]
+    return [(str(name), 1.0) for name in setting]
+
+def search_two_chain(data: ChainList) -> Tuple[Optional[Chain], Optional[List[Tuple[Chain, float]]]]:
     """
-    Поиск входной и выходной сети согласно данным INPUT_CHAIN
+    Поиск входной и выходных сетей согласно данным INPUT_CHAIN
     OUTPUT_CHAIN
     из config.yaml
     :param data:
-    :return:
+    :return: Входная сеть и список (выходная сеть, вес)
     """
-    # Обрабатываем успешный ответ
-    input_chain = None
-    output_chain = None
-    for chain in data.chains:
-        if config.INPUT_CHAIN == chain.name:
-            input_chain = Box(chain)
-        elif config.OUTPUT_CHAIN == chain.name:
-            output_chain = Box(chain)
-        if input_chain and output_chain:
-            break
-
-    if input_chain is None or output_chain is None:
+    chains = index_chains(data)
+    input_chain = chains.get(config.INPUT_CHAIN)
+    outputs = parse_output_chains(config.OUTPUT_CHAIN)
+    missing = [name for name, _ in outputs if name not in chains]
+
+    if input_chain is None or missing or not outputs:
         if not input_chain:
             print(f"Неправильное название входной сети {config.INPUT_CHAIN}")
-        if not output_chain:
-            print(f"Неправильное название выходной сети {config.OUTPUT_CHAIN}")
-        # Выводим на печать названия всех сетей
-        chains_list =  sorted(data.chains, key=lambda chain: getattr(chain, 'name', '').lower())
-        print("Доступные сети:")
-        columns = 5
-        for i in range(0, len(chains_list), columns):
-            row_chains = chains_list[i:i + columns]
-            row_str = "".join(
-                f"{chain.name:<25}" if hasattr(chain, 'name') else "Unknown         "
-                for chain in row_chains
-            )
-            print(row_str)
+        for name in missing:
+            print(f"Неправильное название выходной сети {name}")
+        if not outputs:
+            print("Не задана ни одна выходная сеть")
+        print_chains(chains)
         return None, None
 
-    logger.success(f"Найдены обе цепочки: {input_chain.name} -> {output_chain.name}")
-    return input_chain, output_chain
+    output_chains = [(chains[name], weight) for name, weight in outputs]
+    logger.success(f"Найдены сети: {input_chain.name} -> {', '.join(name for name, _ in outputs)}")
+    return input_chain, output_chains
+
+def print_chains(chains: Dict[str, Chain]):
+    """Выводим на печать названия всех сетей"""
+    chains_list = sorted(chains.values(), key=lambda chain: chain.name.lower())
+    print("Доступные сети:")
+    columns = 5
+    for i in range(0, len(chains_list), columns):
+        row_chains = chains_list[i:i + columns]
+        row_str = "".join(f"{chain.name:<25}" for chain in row_chains)
+        print(row_str)
+
+def parse_input_chains(setting, concurrency: int) -> List[Tuple[str, int]]:
+    """
+    Входные сети из INPUT_CHAINS: названия через запятую, список названий или {название: параллельность}.
+    :param concurrency: Параллельность сети, для которой она не задана
+    :return: Список (название сети, параллельность)
+    """
+    if isinstance(setting, dict):
+        return [(str(name), int(limit or concurrency)) for name, limit in setting.items()]
+    return [(name, concurrency) for name, _ in parse_output_chains(setting)]
+
+def search_sweep_chains(data: ChainList) -> Tuple[Optional[List[Tuple[Chain, int]]],
+                                                  Optional[List[Tuple[Chain, float]]]]:
+    """
+    Поиск входных сетей INPUT_CHAINS и выходных сетей OUTPUT_CHAIN для сбора средств с нескольких сетей.
+    :return: Список (входная сеть, параллельность) и список (выходная сеть, вес)
+    """
+    chains = index_chains(data)
+    inputs = parse_input_chains(config.INPUT_CHAINS, int(config.get('CONCURRENCY', 10)))
+    outputs = parse_output_chains(config.OUTPUT_CHAIN)
+    missing = [name for name, _ in inputs + outputs if name not in chains]
+
+    if missing or not inputs or not outputs:
+        for name in missing:
+            print(f"Неправильное название сети {name}")
+        if not outputs:
+            print("Не задана ни одна выходная сеть")
+        print_chains(chains)
+        return None, None
+
+    logger.success(f"Найдены сети: {', '.join(name for name, _ in inputs)} -> "
+                   f"{', '.join(name for name, _ in outputs)}")
+    return ([(chains[name], limit) for name, limit in inputs],
+            [(chains[name], weight) for name, weight in outputs])
+
+def combine_chains(chains: List[Chain]) -> Chain:
+    """
+    Маршрут депозита сразу в несколько выходных сетей: одна транзакция, Gas.zip делит сумму поровну.
+    В поле chain идентификаторы сетей через запятую, как их принимает /v2/quotes.
+    """
+    if len(chains) == 1:
+        return chains[0]
+    return chains[0].model_copy(update={'name': ' + '.join(chain.name for chain in chains),
+                                        'chain': ','.join(str(chain.chain) for chain in chains)})
+
+def build_routes(output_chains: List[Tuple[Chain, float]]) -> List[Tuple[Chain, float]]:
+    """
+    Маршруты депозитов кошелька: при равных весах — один комбинированный депозит во все сети,
+    иначе отдельный депозит в каждую сеть с долей суммы по весу (отправляются подряд без ожидания чеков).
+    :return: Список (сеть-маршрут, доля суммы)
+    """
+    if len({weight for _, weight in output_chains}) == 1:
+        return [(combine_chains([chain for chain, _ in output_chains]), 1.0)]
+    total = sum(weight for _, weight in output_chains)
+    return [(chain, weight / total) for chain, weight in output_chains]
+
+def plan_deposits(amount: int, routes: List[Tuple[Chain, float]], deposits: int = 1,
+                  sent: int = 0) -> List[Tuple[Chain, int]]:
+    """
+    Разбивает сумму кошелька на депозиты: deposits повторов по всем маршрутам.
+    :param sent: Сколько транзакций кошелька уже отправлено в прерванном прогоне: они пропускаются,
+        а сумма делится между оставшимися
+    """
+    if not sent:
+        per_deposit = amount // deposits
+        return [(chain, int(per_deposit * share)) for _ in range(deposits) for chain, share in routes]
+    left = [(chain, share) for _ in range(deposits) for chain, share in routes][sent:]
+    total = sum(share for _, share in left)
+    return [(chain, int(amount * share / total)) for chain, share in left]
 
 @retry(max_attempts=3, delay=1)
 def request_gas_zip(
@@ -63,10 +182,11 @@ def request_gas_zip(
     json: Optional[dict] = None,
     params: Optional[dict] = None,
     timeout: int = 10,
-) -> Optional[Box]:
-    """Выполняет HTTP-запрос с повторами и возвращает ответ в виде Box."""
+    model: Type[BaseModel] = Quote,
+) -> Optional[BaseModel]:
+    """Выполняет HTTP-запрос с повторами и разбирает ответ в модель model прямо из байтов JSON."""
     try:
-        response = requests.request(
+        response = transport.request(
             method=method,
             url=url,
             json=json,
@@ -74,7 +194,7 @@ def request_gas_zip(
             timeout=timeout
         )
         response.raise_for_status()
-        return Box(response.json())
+        return model.model_validate_json(response.content)
     except requests.exceptions.HTTPError as errh:
         logger.error(f"HTTP Error: {errh}")
         raise  # Важно! Передаем исключение декоратору для повтора
@@ -91,7 +211,7 @@ def request_gas_zip(
         logger.error(f"Ошибка парсинга JSON: {err}")
     return None
 
-def get_quote(input_chain: Box, output_chain:Box, deposit_wei, from_address, to_address):
+def get_quote(input_chain: Chain, output_chain: Chain, deposit_wei, from_address, to_address) -> Optional[Quote]:
     """
 
     :param input_chain:
@@ -101,29 +221,137 @@ def get_quote(input_chain: Box, output_chain:Box, deposit_wei, from_address, to_
     :param to_address:
     :return:
     """
-    base_url = "https://backend.gas.zip/v2/quotes"
+    base_url = f"{GAS_ZIP_API}/v2/quotes"
     deposit_chain = input_chain.chain
     outbound_chain = output_chain.chain
+    cached = quote_cache.get(deposit_chain, outbound_chain, deposit_wei, from_address, to_address)
+    if cached is not None:
+        return cached
+
     full_url = f"{base_url}/{deposit_chain}/{deposit_wei}/{outbound_chain}"
     params = {'from': from_address,'to': to_address}
 
     try:
-        response = request_gas_zip(url=full_url, params=params)
+        with metrics.span('quote', from_address):
+            response = request_gas_zip(url=full_url, params=params)
+        if response is not None:
+            quote_cache.put(deposit_chain, outbound_chain, deposit_wei, from_address, to_address, response)
         return response
     except Exception as error:
         logger.error(f"Ошибка при получении квоты {error}")
         return None
 
-def search_chain(chain_id,chains_list:Box):
+@async_retry(max_attempts=3, delay=1)
+async def async_request_gas_zip(
+    session: aiohttp.ClientSession,
+    method: str = "GET",
+    url: str = None,
+    json: Optional[dict] = None,
+    params: Optional[dict] = None,
+    timeout: int = 10,
+    model: Type[BaseModel] = Quote,
+) -> Optional[BaseModel]:
+    """Асинхронный вариант request_gas_zip поверх общей aiohttp-сессии."""
+    try:
+        async with session.request(
+            method=method,
+            url=url,
+            json=json,
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            response.raise_for_status()
+            return model.model_validate_json(await response.read())
+    except aiohttp.ClientResponseError as errh:
+        logger.error(f"HTTP Error: {errh}")
+        raise
+    except aiohttp.ClientConnectionError as errc:
+        logger.error(f"Ошибка подключения: {errc}")
+        raise
+    except asyncio.TimeoutError as errt:
+        logger.error(f"Таймаут запроса: {errt}")
+        raise
+    except aiohttp.ClientError as err:
+        logger.error(f"Неизвестная ошибка: {err}")
+        raise
+    except ValueError as err:
+        logger.error(f"Ошибка парсинга JSON: {err}")
+    return None
+
+async def async_get_quote(session: aiohttp.ClientSession, input_chain: Chain, output_chain: Chain,
+                          deposit_wei, from_address, to_address) -> Optional[Quote]:
+    """
+    Асинхронный вариант get_quote.
+    :param session: общая aiohttp-сессия
+    :return: Quote или None
+    """
+    cached = quote_cache.get(input_chain.chain, output_chain.chain, deposit_wei, from_address, to_address)
+    if cached is not None:
+        return cached
+
+    full_url = f"{GAS_ZIP_API}/v2/quotes/{input_chain.chain}/{deposit_wei}/{output_chain.chain}"
+    params = {'from': from_address, 'to': to_address}
+
+    try:
+        with metrics.span('quote', from_address):
+            response = await async_request_gas_zip(session, url=full_url, params=params)
+        if response is not None:
+            quote_cache.put(input_chain.chain, output_chain.chain, deposit_wei, from_address, to_address, response)
+        return response
+    except Exception as error:
+        logger.error(f"Ошибка при получении квоты {error}")
+        return None
+
+def deposit_template(input_chain: Chain, output_chain: Chain, deposit_wei, address) -> Optional[ContractDepositTxn]:
+    """
+    Шаблон депозитной транзакции (to/data) для оценки газа.
+    Берётся из кэша по паре сетей; живой quote запрашивается только если шаблона ещё нет.
+    :return: ContractDepositTxn или None
+    """
+    template = quote_cache.template(input_chain.chain, output_chain.chain)
+    if template is not None:
+        return template
+    quote_data = get_quote(input_chain, output_chain, deposit_wei, address, address)
+    return quote_data.contractDepositTxn if quote_data is not None else None
+
+async def async_deposit_template(session: aiohttp.ClientSession, input_chain: Chain, output_chain: Chain,
+                                 deposit_wei, address) -> Optional[ContractDepositTxn]:
+    """Асинхронный вариант deposit_template."""
+    template = quote_cache.template(input_chain.chain, output_chain.chain)
+    if template is not None:
+        return template
+    quote_data = await async_get_quote(session, input_chain, output_chain, deposit_wei, address, address)
+    return quote_data.contractDepositTxn if quote_data is not None else None
+
+def calc_max_fee(base_fee: int, max_priority_fee: int) -> int:
+    """Максимальная цена газа EIP-1559: базовая комиссия с запасом 25% плюс чаевые."""
+    return int(base_fee * 1.25 + max_priority_fee)
+
+def search_chain(chain_id,chains_list):
     """
     Получаем список rpc
     :param chain_id:
-    :param chains_list:
-    :return list of Box:
+    :param chains_list: ChainlistIndex (поиск по индексу) или список сетей Chainlist (линейный поиск)
+    :return list of ChainRpc:
     """
+    if isinstance(chains_list, ChainlistIndex):
+        return chains_list.rpc(chain_id)
     for chain in chains_list:
-        if chain_id == chain.chainId:
-            return BoxList(chain.rpc)
+        if chain_id == chain['chainId']:
+            return [ChainRpc.model_validate(rpc) for rpc in chain['rpc']]
     return None
 
-
+def chain_rpc_urls(input_chain: Chain) -> Optional[List[str]]:
+    """
+    Адреса RPC входной сети: из RPC_URLS (список — для единственной сети INPUT_CHAIN,
+    {сеть: [адреса]} — по сетям), иначе из индекса chain_list.json.
+    """
+    rpc_urls = config.get('RPC_URLS') or []
+    if isinstance(rpc_urls, dict):
+        rpc_urls = rpc_urls.get(input_chain.name) or []
+    elif config.get('INPUT_CHAINS'):
+        rpc_urls = []  # общий список неприменим сразу к нескольким сетям
+    if rpc_urls:
+        return list(rpc_urls)
+    chain_rpc = search_chain(input_chain.chain, chains_list)
+    return [rpc_item.url for rpc_item in chain_rpc] if chain_rpc is not None else None
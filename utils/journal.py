@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from utils.rpc_batch import BatchError, batch_with_failover
+from utils.rpc_pool import RpcPool
+
+# Этапы обработки кошелька в порядке прохождения; reverted/replaced/dropped — финальные статусы без подтверждения
+STAGES = ('quoted', 'signed', 'broadcast', 'confirmed')
+# Этапы, которые нужны для продолжения прогона: записываются на диск сразу, а не пачкой
+DURABLE_STAGES = ('signed', 'broadcast')
+
+
+class RunJournal:
+    """
+    Журнал прогона в SQLite: только добавление записей (адрес кошелька, этап, хэш транзакции).
+    Подписанные и отправленные транзакции записываются на диск сразу, остальные этапы — пачками
+    (при записи, если накопилось flush_every записей или прошло flush_interval секунд, и при close),
+    поэтому журнал почти не тормозит прогон, а после падения по нему можно продолжить с места остановки.
+    """
+
+    def __init__(self, path: Path = Path('journal.sqlite'), flush_every: int = 20, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.run_id: Optional[str] = None
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, started_at REAL NOT NULL, input_chain TEXT, output_chain TEXT);
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL, address TEXT NOT NULL,
+                stage TEXT NOT NULL, tx_hash TEXT, created_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS events_run_address ON events (run_id, address);
+            CREATE INDEX IF NOT EXISTS events_run_tx_hash ON events (run_id, tx_hash);
+        """)
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def start_run(self, input_chain: str, output_chain: str) -> str:
+        """Начинает новый прогон и возвращает его идентификатор."""
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with self._lock:
+            self._connection.execute("INSERT INTO runs VALUES (?, ?, ?, ?)",
+                                     (self.run_id, time.time(), input_chain, output_chain))
+            self._connection.commit()
+        logger.info(f"Журнал прогона {self.run_id}: {self.path}")
+        return self.run_id
+
+    def resume_run(self, run_id: Optional[str] = None) -> Optional[str]:
+        """
+        Продолжает прогон run_id (по умолчанию последний).
+        :return: Идентификатор прогона или None, если прогонов нет
+        """
+        with self._lock:
+            if run_id:
+                row = self._connection.execute("SELECT run_id FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            else:
+                row = self._connection.execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self.run_id = row[0]
+        logger.info(f"Продолжаем прогон {self.run_id} из журнала {self.path}")
+        return self.run_id
+
+    def record(self, address: str, stage: str, tx_hash: Optional[str] = None):
+        """Добавляет запись об этапе кошелька."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO events (run_id, address, stage, tx_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, address, stage, tx_hash, time.time()))
+            self._unflushed += 1
+            if (stage in DURABLE_STAGES or self._unflushed >= self.flush_every
+                    or time.monotonic() - self._flushed_at >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        self._connection.commit()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+    def deposits_sent(self) -> Dict[str, int]:
+        """
+        Сколько депозитов кошелька уже в сети: подтверждённые и ещё ожидающие транзакции
+        (откатившиеся, выброшенные и проигравшие замене версии не считаются).
+        Пока обе версии заменённой транзакции ожидают, депозит считается дважды:
+        кошелёк лучше недоотправить, чем отправить депозит повторно.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT address, COUNT(DISTINCT tx_hash) FROM events a WHERE run_id = ? "
+                "AND stage IN ('signed', 'broadcast', 'confirmed') AND tx_hash IS NOT NULL "
+                "AND NOT EXISTS (SELECT 1 FROM events b WHERE b.run_id = ? AND b.tx_hash = a.tx_hash "
+                "AND b.stage IN ('reverted', 'replaced', 'dropped')) GROUP BY address",
+                (self.run_id, self.run_id)).fetchall()
+        return dict(rows)
+
+    def unconfirmed(self) -> Dict[str, List[str]]:
+        """Подписанные или отправленные, но не подтверждённые транзакции: {адрес: [хэши]}."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT address, tx_hash FROM events a WHERE run_id = ? "
+                "AND stage IN ('signed', 'broadcast') AND tx_hash IS NOT NULL "
+                "AND NOT EXISTS (SELECT 1 FROM events b WHERE b.run_id = ? AND b.tx_hash = a.tx_hash "
+                "AND b.stage IN ('confirmed', 'reverted', 'replaced', 'dropped'))",
+                (self.run_id, self.run_id)).fetchall()
+        result: Dict[str, List[str]] = {}
+        for address, tx_hash in rows:
+            result.setdefault(address, []).append(tx_hash)
+        return result
+
+
+def reconcile(journal: RunJournal, rpc_pool: RpcPool) -> Dict[str, List[str]]:
+    """
+    Перепроверяет неподтверждённые транзакции прогона пакетными запросами
+    (eth_getTransactionReceipt и eth_getTransactionByHash для каждой) и дописывает результат в журнал.
+    Транзакции, о которых RPC не ответил, считаются ожидающими и перепроверяются трекером.
+    :return: Транзакции, которые всё ещё ждут включения в блок: {адрес: [хэши]}
+    """
+    unconfirmed = journal.unconfirmed()
+    pairs = [(address, tx_hash) for address, hashes in unconfirmed.items() for tx_hash in hashes]
+    if not pairs:
+        return {}
+
+    calls = []
+    for _, tx_hash in pairs:
+        calls.append(('eth_getTransactionReceipt', [tx_hash]))
+        calls.append(('eth_getTransactionByHash', [tx_hash]))
+    results = batch_with_failover(rpc_pool, calls)
+
+    still_pending: Dict[str, List[str]] = {}
+    for i, (address, tx_hash) in enumerate(pairs):
+        receipt, transaction = results[2 * i], results[2 * i + 1]
+        if isinstance(receipt, BatchError) or isinstance(transaction, BatchError):
+            still_pending.setdefault(address, []).append(tx_hash)
+        elif receipt is not None:
+            stage = 'confirmed' if int(receipt.get('status', '0x1'), 16) == 1 else 'reverted'
+            journal.record(address, stage, tx_hash)
+        elif transaction is not None:
+            still_pending.setdefault(address, []).append(tx_hash)
+        else:
+            # Транзакция так и не попала в сеть (подписана, но не отправлена или выброшена из mempool)
+            journal.record(address, 'dropped', tx_hash)
+    journal.flush()
+    logger.info(f"Перепроверено транзакций из журнала: {len(pairs)}, ещё ожидают подтверждения: "
+                f"{sum(len(hashes) for hashes in still_pending.values())}")
+    return still_pending
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from utils.transport import Transport
+
+
+def atomic_write(path: Path, data: bytes):
+    """Записывает файл целиком или не записывает вовсе: во временный файл, затем замена."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class MetadataCache:
+    """
+    Файловый кэш метаданных (список сетей Gas.zip, Chainlist) с условными запросами.
+    Рядом с телом ответа хранится <файл>.meta.json с ETag, Last-Modified и временем проверки;
+    устаревший файл перепроверяется запросом If-None-Match/If-Modified-Since, и ответ 304 ничего не скачивает.
+    Тело сохраняется в том виде, в каком пришло (без переформатирования), атомарно.
+    Пока данные не старше max_stale, устаревший файл отдаётся сразу, а перепроверка идёт в фоне;
+    если сеть недоступна, используется последняя сохранённая версия.
+    """
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+        self._hot: Dict[Path, Any] = {}
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _meta_path(path: Path) -> Path:
+        return path.with_name(path.name + '.meta.json')
+
+    def _read_meta(self, path: Path) -> dict:
+        try:
+            with open(self._meta_path(path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Файл без метаданных (например, скачанный старой версией): возраст по времени изменения
+            return {'checked_at': path.stat().st_mtime} if path.exists() else {}
+
+    def _write_meta(self, path: Path, meta: dict):
+        atomic_write(self._meta_path(path), json.dumps(meta, separators=(',', ':')).encode('utf-8'))
+
+    def revalidate(self, url: str, path: Path, timeout: float = 20,
+                   on_update: Optional[Callable[[Any], None]] = None) -> bool:
+        """
+        Условный запрос к url: 304 — файл актуален, 200 — сохраняется новое тело.
+        :param on_update: Вызывается с разобранными данными, когда скачана новая версия
+        :return: True, если запрос удался
+        """
+        meta = self._read_meta(path) if path.exists() else {}
+        if meta.get('url', url) != url:
+            meta = {}  # файл скачан с другого адреса, условный запрос к нему неприменим
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            response = self.transport.request(method="GET", url=url, headers=headers, timeout=timeout)
+            if response.status_code == 304:
+                meta['checked_at'] = time.time()
+                self._write_meta(path, meta)
+                logger.info(f"Кэш {path} актуален (304 Not Modified)")
+                return True
+            response.raise_for_status()
+            data = response.json()
+            atomic_write(path, response.content)
+            self._write_meta(path, {'url': url, 'etag': response.headers.get('ETag'),
+                                    'last_modified': response.headers.get('Last-Modified'),
+                                    'checked_at': time.time()})
+            with self._lock:
+                self._hot.pop(path, None)
+            logger.success(f"Кэш {path} обновлён ({len(response.content) / 1024:.0f} КБ)")
+            if on_update is not None:
+                on_update(data)
+            return True
+        except Exception as e:
+            logger.error(f"Не удалось обновить {path} с {url}: {e}")
+            return False
+
+    def _revalidate_in_background(self, url: str, path: Path, timeout: float, on_update):
+        with self._lock:
+            if path in self._revalidating:
+                return
+            self._revalidating.add(path)
+
+        def run():
+            try:
+                self.revalidate(url, path, timeout, on_update)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(path)
+
+        threading.Thread(target=run, name=f"revalidate-{path.name}", daemon=True).start()
+
+    def ensure(self, url: str, path: Path, ttl: float, max_stale: Optional[float] = None, timeout: float = 20,
+               on_update: Optional[Callable[[Any], None]] = None) -> bool:
+        """
+        Проверяет, что у файла path есть пригодная версия, не читая его.
+        :param ttl: Сколько секунд файл считается свежим без запросов
+        :param max_stale: До какого возраста устаревший файл отдаётся сразу с фоновой перепроверкой
+            (None — всегда)
+        :return: True, если файл есть (свежий, перепроверенный или устаревший при недоступной сети);
+            файл, скачанный с другого адреса, при недоступной сети не используется
+        """
+        path = Path(path)
+        meta = self._read_meta(path) if path.exists() else {}
+        same_url = meta.get('url', url) == url
+        if meta and same_url:
+            age = time.time() - float(meta.get('checked_at', 0))
+            if age < ttl:
+                return True
+            if max_stale is None or age < max_stale:
+                logger.info(f"Кэш {path} устарел, используем его и перепроверяем в фоне")
+                self._revalidate_in_background(url, path, timeout, on_update)
+                return True
+        return self.revalidate(url, path, timeout, on_update) or (same_url and path.exists())
+
+    def get(self, url: str, path: Path, ttl: float, max_stale: Optional[float] = None,
+            timeout: float = 20, parse: Callable[[bytes], Any] = json.loads) -> Optional[Any]:
+        """
+        Данные из кэша (см. ensure); разобранный файл держится в памяти до следующего обновления.
+        :param parse: Разбор байтов файла (например, Model.model_validate_json)
+        """
+        path = Path(path)
+        if not self.ensure(url, path, ttl, max_stale, timeout):
+            return None
+        with self._lock:
+            if path in self._hot:
+                return self._hot[path]
+        try:
+            data = parse(path.read_bytes())
+        except (OSError, ValueError) as e:
+            # Последняя сохранённая версия не удаляется: следующая проверка скачает файл заново
+            # безусловным запросом, а при недоступной сети останется хотя бы она
+            logger.error(f"Не удалось разобрать файл кэша {path}: {e}")
+            self._write_meta(path, {'url': url, 'checked_at': 0})
+            return None
+        with self._lock:
+            self._hot[path] = data
+        return data
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+# Перцентили в итоговой таблице и в выгрузке
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Выборка длительностей одного этапа или эндпоинта, в секундах."""
+
+    def __init__(self):
+        self.values: List[float] = []
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.values.append(seconds)
+        self.total += seconds
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    def quantile(self, q: float) -> float:
+        if not self.values:
+            return 0.0
+        values = sorted(self.values)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Metrics:
+    """
+    Метрики прогона: длительности этапов (rpc_probe, connect, quote, estimate, sign, broadcast, receipt, wallet),
+    запросы, ошибки и задержки по эндпоинтам и спаны по кошелькам.
+    Выгружаются в JSON или текстовый формат Prometheus, могут отдаваться по HTTP на /metrics.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages: Dict[str, Histogram] = defaultdict(Histogram)
+        self.stage_errors: Dict[str, int] = defaultdict(int)
+        self.endpoint_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.endpoint_errors: Dict[str, int] = defaultdict(int)
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe(self, stage: str, seconds: float, wallet: Optional[str] = None, ok: bool = True):
+        """Записывает длительность этапа (и спан кошелька, если он указан)."""
+        with self._lock:
+            self.stages[stage].observe(seconds)
+            if not ok:
+                self.stage_errors[stage] += 1
+            if wallet is not None:
+                self.spans.append({'wallet': wallet, 'stage': stage, 'start': time.time() - seconds,
+                                   'duration': seconds, 'ok': ok})
+
+    @contextmanager
+    def span(self, stage: str, wallet: Optional[str] = None):
+        """Замеряет блок кода как этап; исключение отмечает этап ошибкой и пробрасывается дальше."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(stage, time.perf_counter() - started, wallet, ok)
+
+    def record_endpoint(self, endpoint: str, seconds: float, error: bool = False):
+        with self._lock:
+            self.endpoint_latency[endpoint].observe(seconds)
+            if error:
+                self.endpoint_errors[endpoint] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed': time.time() - self.started,
+                'stages': {stage: self._describe(histogram, self.stage_errors.get(stage, 0))
+                           for stage, histogram in self.stages.items()},
+                'endpoints': {endpoint: self._describe(histogram, self.endpoint_errors.get(endpoint, 0))
+                              for endpoint, histogram in self.endpoint_latency.items()},
+                'spans': list(self.spans),
+            }
+
+    @staticmethod
+    def _describe(histogram: Histogram, errors: int) -> dict:
+        result = {'count': histogram.count, 'errors': errors, 'sum': histogram.total}
+        result.update({f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES})
+        return result
+
+    def prometheus_text(self) -> str:
+        """Метрики в текстовом формате Prometheus (summary с перцентилями и счётчики ошибок)."""
+        data = self.to_dict()
+        lines = []
+        for name, label, items in (('bridge_stage_seconds', 'stage', data['stages']),
+                                   ('bridge_endpoint_seconds', 'endpoint', data['endpoints'])):
+            lines.append(f"# TYPE {name} summary")
+            for key, item in sorted(items.items()):
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{label}="{key}",quantile="{q}"}} {item[f"p{int(q * 100)}"]:.6f}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {item["sum"]:.6f}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {item["count"]}')
+            lines.append(f"# TYPE {name.replace('_seconds', '_errors_total')} counter")
+            for key, item in sorted(items.items()):
+                lines.append(f'{name.replace("_seconds", "_errors_total")}{{{label}="{key}"}} {item["errors"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """Сохраняет метрики в файл: .prom — формат Prometheus, иначе JSON."""
+        path = Path(path)
+        if path.suffix == '.prom':
+            content = self.prometheus_text()
+        else:
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        path.write_text(content, encoding='utf-8')
+        logger.info(f"Метрики сохранены в {path}")
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Отдаёт метрики в формате Prometheus на http://host:port/metrics в фоновом потоке."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def log_summary(self):
+        """Итоговая таблица по этапам: число замеров, ошибки и p50/p95/p99 в миллисекундах."""
+        data = self.to_dict()
+        if not data['stages']:
+            return
+        rows = [f"{'Этап':<12} {'замеров':>8} {'ошибок':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}"]
+        for stage, item in sorted(data['stages'].items(), key=lambda entry: -entry[1]['sum']):
+            rows.append(f"{stage:<12} {item['count']:>8} {item['errors']:>7} {item['p50'] * 1000:>9.1f} "
+                        f"{item['p95'] * 1000:>9.1f} {item['p99'] * 1000:>9.1f}")
+        logger.info("Время по этапам:\n" + "\n".join(rows))
+
+
+# Общие метрики прогона
+metrics = Metrics()
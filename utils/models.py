@@ -0,0 +1,77 @@
+from typing import List, Union
+
+from loguru import logger
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, field_validator, model_validator
+
+
+class _Model(BaseModel):
+    """
+    Базовая модель ответов API: разбирается прямо из байтов JSON (model_validate_json),
+    проверяет и конвертирует только объявленные поля, остальные поля ответа пропускаются без разбора.
+    """
+    model_config = ConfigDict(extra='ignore')
+
+
+class ContractDepositTxn(_Model):
+    """Депозитная транзакция из quote Gas.zip."""
+    to: str
+    data: str
+    value: str  # сумма в wei, hex-строка
+
+
+class Quote(_Model):
+    """Quote Gas.zip: из ответа нужна только депозитная транзакция."""
+    contractDepositTxn: ContractDepositTxn
+
+
+class Chain(_Model):
+    """
+    Сеть из /v2/chains Gas.zip (только поля, которые использует скрипт).
+    Обязательны только name и chain; null в остальных полях читается как значение по умолчанию.
+    """
+    name: str
+    chain: Union[int, str]  # chainId; для депозита в несколько сетей — идентификаторы через запятую
+    symbol: str = ''
+    decimals: int = 18
+    price: float = 0.0
+    minOutboundNative: int = 0
+    explorer: str = ''
+    inbound: bool = True
+
+    @field_validator('symbol', 'decimals', 'price', 'minOutboundNative', 'explorer', 'inbound', mode='before')
+    @classmethod
+    def _null_as_default(cls, value, info):
+        return cls.model_fields[info.field_name].default if value is None else value
+
+
+class ChainList(_Model):
+    """Ответ /v2/chains: сети с некорректными данными пропускаются по одной, а не отбрасывают весь список."""
+    chains: List[Chain]
+
+    @field_validator('chains', mode='before')
+    @classmethod
+    def _skip_invalid(cls, value):
+        if not isinstance(value, list):
+            return value
+        chains = []
+        for item in value:
+            try:
+                chains.append(Chain.model_validate(item))
+            except ValidationError as e:
+                name = item.get('name') if isinstance(item, dict) else None
+                logger.warning(f"Сеть Gas.zip {name or item!r} пропущена: {e.error_count()} ошибок в данных")
+        return chains
+
+
+class ChainRpc(_Model):
+    """RPC сети из Chainlist (в старом формате — просто строка с адресом)."""
+    url: str
+
+    @model_validator(mode='before')
+    @classmethod
+    def _from_string(cls, value):
+        return {'url': value} if isinstance(value, str) else value
+
+
+# Разбор списка RPC одной сети из индекса Chainlist
+rpc_list_adapter = TypeAdapter(List[ChainRpc])
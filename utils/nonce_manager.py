@@ -0,0 +1,57 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Set
+
+
+class NonceManager:
+    """
+    Локальная выдача nonce по кошелькам.
+    Стартовое значение берётся из pending-счётчика сети, дальше nonce выдаются из памяти, поэтому
+    один кошелёк может отправить несколько транзакций подряд, не дожидаясь чеков.
+    Nonce транзакций, которые не удалось отправить, возвращаются и выдаются повторно первыми,
+    чтобы в последовательности не оставалось дыр.
+    """
+
+    def __init__(self):
+        self._next: Dict[str, int] = {}
+        self._gaps: Dict[str, Set[int]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def sync(self, address: str, pending_nonce: int):
+        """Учитывает pending nonce из сети (выданные локально, но ещё не видимые сети, не теряются)."""
+        with self._lock:
+            if pending_nonce > self._next.get(address, 0):
+                self._next[address] = pending_nonce
+                self._gaps[address] = {nonce for nonce in self._gaps[address] if nonce >= pending_nonce}
+
+    def reset(self, address: str, pending_nonce: int):
+        """Сбрасывает состояние кошелька на значение из сети (например, после ошибки nonce too low)."""
+        with self._lock:
+            self._next[address] = pending_nonce
+            self._gaps.pop(address, None)
+
+    def allocate(self, address: str) -> int:
+        """Следующий nonce кошелька: сначала закрываем дыры, затем продолжаем счётчик."""
+        with self._lock:
+            gaps = self._gaps[address]
+            if gaps:
+                nonce = min(gaps)
+                gaps.remove(nonce)
+                return nonce
+            nonce = self._next.get(address, 0)
+            self._next[address] = nonce + 1
+            return nonce
+
+    def release(self, address: str, nonce: int):
+        """Возвращает nonce транзакции, которая так и не попала в сеть."""
+        with self._lock:
+            gaps = self._gaps[address]
+            gaps.add(nonce)
+            # Дыры на вершине счётчика просто откатывают его назад
+            while self._next.get(address, 0) - 1 in gaps:
+                self._next[address] -= 1
+                gaps.remove(self._next[address])
+
+
+# Общий менеджер nonce для всех отправителей
+nonce_manager = NonceManager()
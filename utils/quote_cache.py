@@ -0,0 +1,82 @@
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from utils.models import ContractDepositTxn, Quote
+
+
+class QuoteCache:
+    """
+    Кэш quote от Gas.zip с временем жизни.
+    Ключ: (входная сеть, выходная сеть, корзина суммы, отправитель, получатель). Суммы, отличающиеся меньше чем
+    на bucket_bps базисных пунктов, попадают в одну корзину; при попадании в кэш value транзакции
+    подменяется на запрошенную сумму.
+    Дополнительно хранит шаблон депозитной транзакции (to/data) для пары сетей: он не зависит от суммы
+    и годится для оценки газа, поэтому живой quote нужен только один на кошелёк.
+    """
+
+    def __init__(self, ttl: float = 30, bucket_bps: int = 50, template_ttl: float = 600):
+        """
+        :param ttl: Время жизни quote в секундах
+        :param bucket_bps: Ширина корзины суммы в базисных пунктах (50 = 0.5%)
+        :param template_ttl: Время жизни шаблона депозитной транзакции в секундах
+        """
+        self.ttl = ttl
+        self.template_ttl = template_ttl
+        self._log_step = math.log1p(bucket_bps / 10_000)
+        self._quotes: Dict[Tuple, Tuple[float, Quote]] = {}
+        self._templates: Dict[Tuple, Tuple[float, ContractDepositTxn]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.template_hits = 0
+        self.template_misses = 0
+
+    def _bucket(self, amount) -> int:
+        amount = int(amount)
+        return int(math.log(amount) / self._log_step) if amount > 0 else 0
+
+    def _key(self, deposit_chain, outbound_chain, amount, from_address, to_address) -> Tuple:
+        return (deposit_chain, outbound_chain, self._bucket(amount), from_address.lower(), to_address.lower())
+
+    def get(self, deposit_chain, outbound_chain, amount, from_address, to_address) -> Optional[Quote]:
+        """Quote из кэша с value, равным запрошенной сумме, или None."""
+        key = self._key(deposit_chain, outbound_chain, amount, from_address, to_address)
+        with self._lock:
+            cached = self._quotes.get(key)
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                self._quotes.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+        txn = cached[1].contractDepositTxn
+        return Quote(contractDepositTxn=txn.model_copy(update={'value': hex(int(amount))}))
+
+    def put(self, deposit_chain, outbound_chain, amount, from_address, to_address, quote: Quote):
+        """Сохраняет quote и обновляет шаблон депозитной транзакции для пары сетей."""
+        now = time.monotonic()
+        with self._lock:
+            self._quotes[self._key(deposit_chain, outbound_chain, amount, from_address, to_address)] = (now, quote)
+            self._templates[(deposit_chain, outbound_chain)] = (now, quote.contractDepositTxn)
+
+    def template(self, deposit_chain, outbound_chain) -> Optional[ContractDepositTxn]:
+        """Шаблон депозитной транзакции (to/data) для пары сетей или None."""
+        with self._lock:
+            cached = self._templates.get((deposit_chain, outbound_chain))
+            if cached is None or time.monotonic() - cached[0] > self.template_ttl:
+                self.template_misses += 1
+                return None
+            self.template_hits += 1
+            return cached[1]
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        template_total = self.template_hits + self.template_misses
+        template_rate = self.template_hits / template_total * 100 if template_total else 0.0
+        logger.info(f"Кэш quote: запросов {total}, из кэша {self.hits} ({hit_rate:.0f}%); "
+                    f"шаблон транзакции для оценки газа из кэша {self.template_hits}/{template_total} "
+                    f"({template_rate:.0f}%)")
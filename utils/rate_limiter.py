@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from loguru import logger
+
+# Ответы, после которых лимит снижается вдвое и хост ставится на паузу по Retry-After
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Заголовок Retry-After в секундах (число секунд или HTTP-дата)."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket одного хоста с адаптивной скоростью (AIMD).
+    Каждый запрос забирает токен; если токенов нет, вызывающий ждёт своей очереди.
+    429/503 снижают скорость вдвое и ставят хост на паузу по Retry-After, прочие 5xx — на 20%,
+    успешные ответы плавно (на increase запросов/с за секунду) поднимают её обратно вплоть до max_rate.
+    """
+
+    def __init__(self, rate: float, burst: float, max_rate: Optional[float] = None, min_rate: float = 0.5):
+        """
+        :param rate: Начальная скорость, запросов в секунду
+        :param burst: Сколько запросов можно отправить подряд без ожидания
+        :param max_rate: Потолок скорости при адаптации (по умолчанию rate)
+        :param min_rate: Нижняя граница скорости
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate or rate
+        self.min_rate = min(min_rate, rate)
+        self.increase = self.max_rate * 0.05
+        self.tokens = burst
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Забирает токен и возвращает, сколько секунд нужно подождать перед запросом."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def async_acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_throttled(self, retry_after: Optional[float] = None, factor: float = 0.5):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * factor)
+            self.throttled += 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+
+class RateLimiter:
+    """Ограничение частоты запросов по хостам: у каждого хоста свой TokenBucket."""
+
+    def __init__(self, rate: float = 10, burst: float = 20, max_rate: Optional[float] = None,
+                 limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        :param rate: Запросов в секунду на хост по умолчанию
+        :param burst: Размер пачки запросов без ожидания по умолчанию
+        :param max_rate: Потолок адаптивной скорости по умолчанию (None — не выше rate)
+        :param limits: Отдельные лимиты хостов: {хост: (rate, burst)}
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.limits = limits or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "RateLimiter":
+        config = config or {}
+        limits = {host: (float(limit[0]), float(limit[1])) for host, limit in (config.get('RATE_LIMITS') or {}).items()}
+        max_rate = config.get('RATE_LIMIT_MAX_RPS')
+        return cls(rate=float(config.get('RATE_LIMIT_RPS', 10)), burst=float(config.get('RATE_LIMIT_BURST', 20)),
+                   max_rate=float(max_rate) if max_rate else None, limits=limits)
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlparse(str(url)).hostname or ''
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.limits.get(host, (self.rate, self.burst))
+                max_rate = self.max_rate if host not in self.limits else None
+                bucket = self._buckets[host] = TokenBucket(rate, burst, max_rate=max_rate and max(max_rate, rate))
+            return bucket
+
+    def acquire(self, url: str):
+        self.bucket(url).acquire()
+
+    async def async_acquire(self, url: str):
+        await self.bucket(url).async_acquire()
+
+    def report(self, url: str, status: int, retry_after=None):
+        """Учитывает ответ хоста: 429/503 и 5xx снижают скорость, успешные ответы её поднимают."""
+        bucket = self.bucket(url)
+        if status in THROTTLE_STATUSES:
+            bucket.on_throttled(parse_retry_after(retry_after))
+        elif status >= 500:
+            bucket.on_throttled(factor=0.8)
+        elif status < 400:
+            bucket.on_success()
+
+    def log_stats(self):
+        for host, bucket in sorted(self._buckets.items()):
+            if bucket.throttled:
+                logger.info(f"Лимит {host}: {bucket.rate:.1f} запросов/с, ответов 429/5xx: {bucket.throttled}")
@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from hexbytes import HexBytes
+from loguru import logger
+from web3 import Web3
+
+from utils.metrics import metrics
+from utils.rpc_batch import BatchError, batch_with_failover
+from utils.rpc_pool import RpcPool
+
+# Финальные статусы исходящих транзакций Gas.zip
+OUTBOUND_FINAL = {'CONFIRMED', 'CANCELLED', 'FAILED'}
+
+
+class TrackedTx:
+    """Отправленная транзакция, за которой следит ReceiptTracker."""
+
+    def __init__(self, tx_hash: HexBytes, address: str, label: str = '', replace: Optional[Callable] = None):
+        self.tx_hash = HexBytes(tx_hash)  # после подтверждения — хэш той версии, что попала в блок
+        self.hashes: List[HexBytes] = [self.tx_hash]  # исходная транзакция и её замены с тем же nonce
+        self.address = address
+        self.label = label
+        self.replace = replace  # функция замены зависшей транзакции (sender.replace_transaction)
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at  # задаётся трекером: до какого момента ждать чек
+        self.status = 'pending'  # pending / confirmed / reverted / timeout
+        self.block_number: Optional[int] = None
+        self.confirmed_at: Optional[float] = None
+        self.outbound_status: Optional[str] = None
+        self.outbound_checked_at = 0.0
+
+    @property
+    def hex(self) -> str:
+        return '0x' + self.tx_hash.hex().removeprefix('0x')
+
+    @property
+    def replaced(self) -> List[str]:
+        """Хэши версий транзакции, которые не попали в блок."""
+        return ['0x' + tx_hash.hex().removeprefix('0x') for tx_hash in self.hashes if tx_hash != self.tx_hash]
+
+
+class ReceiptTracker:
+    """
+    Фоновый поток, подтверждающий отправленные транзакции.
+    Отправка возвращается сразу, а трекер на каждом новом блоке одним пакетом запрашивает
+    eth_getTransactionReceipt для всех ожидающих транзакций, сообщает о подтверждениях, откатах и таймаутах
+    через колбэки и, где возможно, отслеживает доставку средств Gas.zip в выходную сеть.
+    Зависшая транзакция один раз заменяется с поднятой ценой газа; после замены опрашиваются обе версии,
+    пока одна из них не попадёт в блок.
+    """
+
+    def __init__(self, rpc_pool: RpcPool, timeout: float = 300, poll_interval: float = 1.0,
+                 gas_zip_api: Optional[str] = None, outbound_poll_interval: float = 10, outbound_batch: int = 20,
+                 chunk_size: int = 100,
+                 on_confirmed: Optional[Callable[[TrackedTx], None]] = None,
+                 on_reverted: Optional[Callable[[TrackedTx], None]] = None,
+                 on_timeout: Optional[Callable[[TrackedTx], None]] = None,
+                 on_replaced: Optional[Callable[[TrackedTx], None]] = None):
+        """
+        :param rpc_pool: Пул RPC входной сети
+        :param timeout: Сколько ждать включения транзакции в блок, в секундах
+        :param poll_interval: Как часто проверять номер блока, в секундах
+        :param gas_zip_api: Базовый адрес API Gas.zip для статуса доставки (None — не отслеживать)
+        :param outbound_poll_interval: Как часто спрашивать статус доставки, в секундах
+        :param outbound_batch: Сколько депозитов проверять за один опрос (запросы идут через тот же лимит
+            скорости Gas.zip, что и quote)
+        :param chunk_size: Сколько чеков запрашивать в одном пакете
+        :param on_replaced: Вызывается после подтверждения или отката заменённой транзакции;
+            хэши версий, не попавших в блок, — в TrackedTx.replaced
+        """
+        self.rpc_pool = rpc_pool
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.gas_zip_api = gas_zip_api
+        self.outbound_poll_interval = outbound_poll_interval
+        self.outbound_batch = outbound_batch
+        self.chunk_size = chunk_size
+        self.on_confirmed = on_confirmed
+        self.on_reverted = on_reverted
+        self.on_timeout = on_timeout
+        self.on_replaced = on_replaced
+        self.transactions: List[TrackedTx] = []
+        self._pending: Dict[HexBytes, TrackedTx] = {}
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._outbound_thread: Optional[threading.Thread] = None
+        self._outbound_stopped = threading.Event()
+        self._last_block: Optional[int] = None
+
+    def start(self) -> "ReceiptTracker":
+        self._thread = threading.Thread(target=self._run, name='receipt-tracker', daemon=True)
+        self._thread.start()
+        if self.gas_zip_api:
+            # Статус доставки опрашивается в своём потоке и не задерживает чеки и таймауты
+            self._outbound_thread = threading.Thread(target=self._run_outbound, name='receipt-tracker-outbound',
+                                                     daemon=True)
+            self._outbound_thread.start()
+        return self
+
+    def track(self, tx_hash: HexBytes, address: str, label: str = '', replace: Optional[Callable] = None) -> TrackedTx:
+        """Ставит транзакцию на отслеживание и сразу возвращает управление."""
+        tracked = TrackedTx(tx_hash, address, label, replace)
+        tracked.deadline = tracked.submitted_at + self.timeout
+        with self._lock:
+            self.transactions.append(tracked)
+            self._pending[tracked.tx_hash] = tracked
+        return tracked
+
+    def _finish(self, tracked: TrackedTx, status: str, callback: Optional[Callable]):
+        tracked.status = status
+        callbacks = [callback]
+        if status != 'timeout' and tracked.replaced:
+            callbacks.append(self.on_replaced)  # в блок попала одна версия, остальные больше не нужны
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(tracked)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике статуса транзакции {tracked.hex}: {e}")
+
+    def _poll_receipts(self, w3: Web3):
+        with self._lock:
+            pending = list(self._pending.values())
+        if not pending:
+            return
+
+        # Чеки запрашиваем только когда появился новый блок, пакетами по chunk_size с переходом на другой RPC;
+        # у заменённой транзакции — для каждой версии, в блок может попасть любая из них
+        block_number = w3.eth.block_number
+        if self._last_block is None or block_number > self._last_block:
+            self._last_block = block_number
+            versions = [(tracked, tx_hash) for tracked in pending for tx_hash in list(tracked.hashes)]
+            results = batch_with_failover(
+                self.rpc_pool,
+                [('eth_getTransactionReceipt', ['0x' + tx_hash.hex().removeprefix('0x')]) for _, tx_hash in versions],
+                self.chunk_size)
+            now = time.monotonic()
+            for (tracked, tx_hash), receipt in zip(versions, results):
+                if receipt is None or isinstance(receipt, BatchError) or tracked.status != 'pending':
+                    continue
+                with self._lock:
+                    self._pending.pop(tracked.hashes[0], None)
+                tracked.tx_hash = tx_hash
+                tracked.block_number = int(receipt['blockNumber'], 16)
+                tracked.confirmed_at = now
+                metrics.observe('receipt', now - tracked.submitted_at, tracked.address)
+                if int(receipt.get('status', '0x1'), 16) == 1:
+                    self._finish(tracked, 'confirmed', self.on_confirmed)
+                else:
+                    self._finish(tracked, 'reverted', self.on_reverted)
+
+    def _expire(self):
+        """Таймауты проверяются на каждой итерации, даже если ни один RPC не ответил."""
+        with self._lock:
+            pending = list(self._pending.values())
+        now = time.monotonic()
+        for tracked in pending:
+            if tracked.status == 'pending' and now > tracked.deadline:
+                self._handle_timeout(tracked)
+
+    def _handle_timeout(self, tracked: TrackedTx):
+        if tracked.replace is not None:
+            # Одна попытка замены с поднятой ценой газа; исходная версия остаётся в опросе вместе с новой
+            replace, tracked.replace = tracked.replace, None
+            try:
+                tracked.hashes.append(HexBytes(replace(tracked.hashes[-1])))
+                tracked.deadline = time.monotonic() + self.timeout
+                return
+            except Exception as e:
+                logger.error(f"Не удалось заменить зависшую транзакцию {tracked.hex}: {e}")
+        with self._lock:
+            self._pending.pop(tracked.hashes[0], None)
+        self._finish(tracked, 'timeout', self.on_timeout)
+
+    def _outbound_candidates(self) -> List[TrackedTx]:
+        with self._lock:
+            transactions = list(self.transactions)
+        return [tracked for tracked in transactions
+                if tracked.status == 'confirmed' and tracked.outbound_status not in OUTBOUND_FINAL]
+
+    def _poll_outbound(self):
+        """Один опрос: не больше outbound_batch депозитов, сначала те, что дольше всех не проверялись."""
+        candidates = sorted(self._outbound_candidates(), key=lambda tracked: tracked.outbound_checked_at)
+        for tracked in candidates[:self.outbound_batch]:
+            tracked.outbound_checked_at = time.monotonic()
+            try:
+                response = self.rpc_pool.transport.request(url=f"{self.gas_zip_api}/v2/deposit/{tracked.hex}")
+                if response.status_code != 200:
+                    continue
+                outbound = response.json().get('txs') or []
+                statuses = {str(tx.get('status', '')).upper() for tx in outbound}
+                if statuses:
+                    tracked.outbound_status = statuses.pop() if len(statuses) == 1 else 'PARTIAL'
+            except Exception as e:
+                logger.debug(f"Статус доставки Gas.zip для {tracked.hex} недоступен: {e}")
+
+    def _run_outbound(self):
+        while not self._outbound_stopped.wait(self.outbound_poll_interval):
+            self._poll_outbound()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                has_pending = bool(self._pending)
+            if self._closing.is_set() and not has_pending:
+                break
+            w3 = self.rpc_pool.w3()
+            if w3 is not None:
+                try:
+                    self._poll_receipts(w3)
+                except Exception as e:
+                    self.rpc_pool.report_error(w3.provider.endpoint_uri, e)
+            self._expire()
+            time.sleep(self.poll_interval)
+
+    def close(self, outbound_timeout: float = 0, join_timeout: Optional[float] = None):
+        """
+        Дожидается финального статуса всех транзакций и останавливает поток.
+        :param outbound_timeout: Сколько дополнительно ждать доставки средств Gas.zip, в секундах
+        :param join_timeout: Сколько ждать финальных статусов, в секундах
+            (по умолчанию два timeout: на исходную транзакцию и одну замену)
+        """
+        self._closing.set()
+        if self._thread is not None:
+            self._thread.join(join_timeout if join_timeout is not None else 2 * self.timeout + self.poll_interval)
+            if self._thread.is_alive():
+                with self._lock:
+                    left = len(self._pending)
+                logger.warning(f"Не дождались финального статуса {left} транзакций, завершаем без них")
+        deadline = time.monotonic() + outbound_timeout
+        while self._outbound_thread is not None and self._outbound_candidates() and time.monotonic() < deadline:
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+        self._outbound_stopped.set()
+        if self._outbound_thread is not None:
+            self._outbound_thread.join(self.outbound_poll_interval)
+        self.log_summary()
+
+    def summary(self) -> Counter:
+        return Counter(tracked.status for tracked in self.transactions)
+
+    def log_summary(self):
+        counts = self.summary()
+        if not counts:
+            return
+        confirmed = [tracked for tracked in self.transactions if tracked.confirmed_at is not None]
+        average = (sum(tracked.confirmed_at - tracked.submitted_at for tracked in confirmed) / len(confirmed)
+                   if confirmed else 0.0)
+        logger.info(f"Транзакции: подтверждено {counts['confirmed']}, откатилось {counts['reverted']}, "
+                    f"таймаут {counts['timeout']}; среднее время подтверждения {average:.1f} с")
+        outbound = Counter(tracked.outbound_status for tracked in self.transactions if tracked.outbound_status)
+        if outbound:
+            logger.info("Доставка Gas.zip: " + ", ".join(f"{status} {count}" for status, count in outbound.items()))
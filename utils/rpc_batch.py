@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from web3 import AsyncWeb3, Web3
+
+from utils.fee_oracle import FeeOracle, FeeParams
+from utils.rpc_pool import RpcPool
+
+# Вызов JSON-RPC: (метод, параметры)
+RpcCall = Tuple[str, list]
+
+
+class BatchError(Exception):
+    """Ошибка в ответе на пакетный JSON-RPC запрос."""
+
+
+def _unpack(responses: Any, size: int) -> Optional[List[Dict]]:
+    """
+    Проверяет ответ на пакет и возвращает его элементы в порядке запросов.
+    :return: None, если узел отклонил пакет целиком (например, пакеты не поддерживаются)
+    """
+    if not isinstance(responses, list):
+        return None
+    if len(responses) != size:
+        raise BatchError(f"Ожидалось {size} ответов в пакете, получено {len(responses)}")
+    return sorted(responses, key=lambda response: response.get('id', 0))
+
+
+def _results(responses: List[Dict]) -> List[Any]:
+    """Результаты ответов; ответ с ошибкой превращается в BatchError."""
+    results = []
+    for response in responses:
+        if response.get('error'):
+            results.append(BatchError(response['error']))
+        else:
+            results.append(response.get('result'))
+    return results
+
+
+def batch_call(w3: Web3, calls: Sequence[RpcCall]) -> List[Any]:
+    """
+    Отправляет несколько вызовов одним пакетным JSON-RPC запросом.
+    Если узел не поддерживает пакеты, выполняет вызовы по одному.
+    :return: Результаты в порядке вызовов; вызов с ошибкой возвращается как BatchError
+    """
+    responses = _unpack(w3.provider.make_batch_request(list(calls)), len(calls))
+    if responses is None:
+        responses = [w3.provider.make_request(method, params) for method, params in calls]
+    return _results(responses)
+
+
+def batch_with_failover(rpc_pool: RpcPool, calls: Sequence[RpcCall], chunk_size: int = 100) -> List[Any]:
+    """
+    Выполняет вызовы пакетами по chunk_size; пакет, на который RPC не ответил, повторяется на следующем RPC пула.
+    :return: Результаты в порядке вызовов; вызов с ошибкой (или пакет, на который не ответил ни один RPC) — BatchError
+    """
+    results = []
+    for start in range(0, len(calls), chunk_size):
+        chunk = list(calls[start:start + chunk_size])
+        chunk_results = rpc_pool.with_failover(lambda endpoint: batch_call(rpc_pool.w3(endpoint), chunk),
+                                               measure=False)
+        if chunk_results is None:
+            chunk_results = [BatchError("Ни один RPC не ответил на пакетный запрос")] * len(chunk)
+        results.extend(chunk_results)
+    return results
+
+
+async def async_batch_call(w3: AsyncWeb3, calls: Sequence[RpcCall]) -> List[Any]:
+    """Асинхронный вариант batch_call."""
+    responses = _unpack(await w3.provider.make_batch_request(list(calls)), len(calls))
+    if responses is None:
+        responses = [await w3.provider.make_request(method, params) for method, params in calls]
+    return _results(responses)
+
+
+def _raise_on_error(results: List[Any]) -> List[Any]:
+    for result in results:
+        if isinstance(result, BatchError):
+            raise result
+    return results
+
+
+@dataclass
+class WalletSnapshot:
+    """
+    Состояние кошелька и сети на один момент, общее для предварительной проверки и отправки.
+    Параметры газа заполняются из общего FeeOracle по номеру блока.
+    """
+    address: str
+    balance: int
+    nonce: int
+    chain_id: int
+    block_number: int
+    base_fee: Optional[int] = None
+    max_priority_fee: Optional[int] = None
+
+    def apply_fees(self, fees: FeeParams, percentile: int):
+        self.base_fee = fees.base_fee
+        self.max_priority_fee = fees.priority_fee(percentile)
+
+
+def snapshot_calls(address: str) -> List[RpcCall]:
+    return [
+        ('eth_getBalance', [address, 'latest']),
+        ('eth_getTransactionCount', [address, 'pending']),
+        ('eth_chainId', []),
+        ('eth_blockNumber', []),
+    ]
+
+
+def parse_snapshot(address: str, results: List[Any]) -> WalletSnapshot:
+    """Собирает WalletSnapshot из результатов snapshot_calls."""
+    balance, nonce, chain_id, block_number = _raise_on_error(results)
+    return WalletSnapshot(
+        address=address,
+        balance=int(balance, 16),
+        nonce=int(nonce, 16),
+        chain_id=int(chain_id, 16),
+        block_number=int(block_number, 16),
+    )
+
+
+def fetch_snapshot(w3: Web3, address: str, fee_oracle: FeeOracle) -> WalletSnapshot:
+    """Баланс, nonce, chain_id и номер блока одним пакетным запросом, параметры газа из FeeOracle."""
+    snapshot = parse_snapshot(address, batch_call(w3, snapshot_calls(address)))
+    snapshot.apply_fees(fee_oracle.get(w3, snapshot.block_number), fee_oracle.tip_percentile)
+    return snapshot
+
+
+async def async_fetch_snapshot(w3: AsyncWeb3, address: str, fee_oracle: FeeOracle) -> WalletSnapshot:
+    """Асинхронный вариант fetch_snapshot."""
+    snapshot = parse_snapshot(address, await async_batch_call(w3, snapshot_calls(address)))
+    snapshot.apply_fees(await fee_oracle.async_get(w3, snapshot.block_number), fee_oracle.tip_percentile)
+    return snapshot
+
+
+def _hex_or_none(value: Any) -> Optional[int]:
+    return None if isinstance(value, BatchError) or value is None else int(value, 16)
+
+
+def fetch_balances_and_nonces(rpc_pool: RpcPool, addresses: Sequence[str],
+                              chunk_size: int = 250) -> Dict[str, Optional[Tuple[int, int]]]:
+    """
+    Балансы и pending nonce сразу для многих кошельков, по chunk_size кошельков в одном пакете
+    (пакет, на который RPC не ответил, повторяется на следующем RPC пула).
+    :return: {адрес: (баланс, nonce)}; None, если узел не вернул баланс или nonce кошелька
+    """
+    calls = []
+    for address in addresses:
+        calls.append(('eth_getBalance', [address, 'latest']))
+        calls.append(('eth_getTransactionCount', [address, 'pending']))
+    values = batch_with_failover(rpc_pool, calls, 2 * chunk_size)
+    result = {}
+    for i, address in enumerate(addresses):
+        balance, nonce = _hex_or_none(values[2 * i]), _hex_or_none(values[2 * i + 1])
+        result[address] = None if balance is None or nonce is None else (balance, nonce)
+    return result
+
+
+def fetch_balances(rpc_pool: RpcPool, addresses: Sequence[str], chunk_size: int = 500) -> Dict[str, Optional[int]]:
+    """
+    Только балансы многих кошельков, по chunk_size кошельков в одном пакете, с переходом на другой RPC пула.
+    :return: {адрес: баланс}; None, если узел не вернул баланс кошелька
+    """
+    values = batch_with_failover(rpc_pool, [('eth_getBalance', [address, 'latest']) for address in addresses],
+                                 chunk_size)
+    return {address: _hex_or_none(value) for address, value in zip(addresses, values)}
@@ -0,0 +1,189 @@
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+from loguru import logger
+from web3 import Web3
+
+from utils.metrics import metrics
+from utils.transport import Transport
+
+T = TypeVar('T')
+
+
+class RpcEndpoint:
+    """Состояние одного RPC: замеры задержки, последний блок и счётчики ошибок."""
+
+    def __init__(self, url: str, window: int = 20):
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.head_block: Optional[int] = None
+        self.errors = 0
+        self.failures = 0  # ошибки подряд, сбрасываются после успешного запроса
+        self.cooldown_until = 0.0
+
+    @property
+    def p50(self) -> float:
+        """Медианная задержка в секундах (inf, если замеров нет)."""
+        return statistics.median(self.latencies) if self.latencies else float('inf')
+
+    def is_available(self, now: float) -> bool:
+        return bool(self.latencies) and now >= self.cooldown_until
+
+    def __repr__(self):
+        return f"RpcEndpoint({self.url}, p50={self.p50 * 1000:.0f}ms, head={self.head_block}, errors={self.errors})"
+
+
+class RpcPool:
+    """
+    Общий для всех кошельков пул RPC одной сети.
+    При старте параллельно опрашивает все адреса, ранжирует их по медианной задержке и свежести блока,
+    выдаёт лучший доступный RPC и временно выключает (circuit breaker) RPC, на которых случаются ошибки.
+    """
+
+    def __init__(self, urls: Iterable[str], transport: Optional[Transport] = None, schemes=('http', 'https'), probes: int = 3, probe_timeout: float = 5,
+                 max_block_lag: int = 5, cooldown: float = 30, max_cooldown: float = 600):
+        """
+        :param urls: Адреса RPC (дубликаты, неподходящие схемы и шаблоны с ключами API отбрасываются)
+        :param transport: Общий HTTP-транспорт для пробных запросов
+        :param schemes: Допустимые схемы URL
+        :param probes: Количество пробных запросов к каждому RPC при старте
+        :param probe_timeout: Таймаут пробного запроса в секундах
+        :param max_block_lag: На сколько блоков RPC может отставать от лучшего, чтобы считаться свежим
+        :param cooldown: Начальная пауза после ошибки в секундах (удваивается при ошибках подряд)
+        :param max_cooldown: Максимальная пауза в секундах
+        """
+        self._by_url = {}
+        for url in urls:
+            if url in self._by_url or '${' in url or urlparse(url).scheme not in schemes:
+                continue
+            self._by_url[url] = RpcEndpoint(url)
+        self.endpoints: List[RpcEndpoint] = list(self._by_url.values())
+        self.transport = transport or Transport()
+        self.probes = probes
+        self.probe_timeout = probe_timeout
+        self.max_block_lag = max_block_lag
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+
+    def _probe(self, endpoint: RpcEndpoint):
+        w3 = Web3(self.transport.http_provider(endpoint.url, timeout=self.probe_timeout))
+        for _ in range(self.probes):
+            started = time.monotonic()
+            try:
+                block_number = w3.eth.block_number
+            except Exception as e:
+                metrics.observe('rpc_probe', time.monotonic() - started, ok=False)
+                self.report_error(endpoint.url, e)
+                return
+            metrics.observe('rpc_probe', time.monotonic() - started)
+            self.report_success(endpoint.url, time.monotonic() - started, block_number)
+
+    def probe_all(self, max_workers: int = 32) -> int:
+        """
+        Параллельно опрашивает все RPC пула.
+        :return: Количество доступных RPC
+        """
+        if not self.endpoints:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(self.endpoints))) as executor:
+            list(executor.map(self._probe, self.endpoints))
+
+        ranked = self.ranked()
+        logger.info(f"RPC пул: доступно {len(ranked)} из {len(self.endpoints)}")
+        for endpoint in ranked[:5]:
+            logger.info(f"  {endpoint.url} p50={endpoint.p50 * 1000:.0f} мс, блок {endpoint.head_block}")
+        return len(ranked)
+
+    def report_success(self, url: str, latency: float, head_block: Optional[int] = None):
+        """Учитывает успешный запрос к RPC."""
+        with self._lock:
+            endpoint = self._by_url.get(url)
+            if endpoint is None:
+                return
+            endpoint.latencies.append(latency)
+            endpoint.failures = 0
+            if head_block is not None:
+                endpoint.head_block = max(head_block, endpoint.head_block or 0)
+
+    def report_error(self, url: str, error: Optional[Exception] = None):
+        """Учитывает ошибку RPC и отправляет его на паузу с экспоненциальным ростом."""
+        with self._lock:
+            endpoint = self._by_url.get(url)
+            if endpoint is None:
+                return
+            endpoint.errors += 1
+            endpoint.failures += 1
+            pause = min(self.cooldown * 2 ** (endpoint.failures - 1), self.max_cooldown)
+            endpoint.cooldown_until = time.monotonic() + pause
+        logger.warning(f"RPC {url} отключён на {pause:.0f} с после ошибки: {error}")
+
+    def ranked(self) -> List[RpcEndpoint]:
+        """Доступные RPC: сначала свежие по блоку, затем по медианной задержке."""
+        now = time.monotonic()
+        with self._lock:
+            available = [endpoint for endpoint in self.endpoints if endpoint.is_available(now)]
+            best_head = max((endpoint.head_block or 0 for endpoint in available), default=0)
+            return sorted(available, key=lambda endpoint: (
+                best_head - (endpoint.head_block or 0) > self.max_block_lag, endpoint.p50))
+
+    def best(self) -> Optional[RpcEndpoint]:
+        """Лучший доступный RPC или None."""
+        ranked = self.ranked()
+        return ranked[0] if ranked else None
+
+    def w3(self, endpoint: Optional[RpcEndpoint] = None) -> Optional[Web3]:
+        """Web3 на указанном RPC (по умолчанию на лучшем доступном) или None."""
+        endpoint = endpoint or self.best()
+        return Web3(self.transport.http_provider(endpoint.url)) if endpoint else None
+
+    def candidates(self) -> List[RpcEndpoint]:
+        """
+        RPC в порядке предпочтения для перебора при отказе.
+        Если все RPC на паузе, возвращает когда-либо отвечавшие RPC в порядке окончания паузы.
+        """
+        ranked = self.ranked()
+        if ranked:
+            return ranked
+        with self._lock:
+            return sorted((endpoint for endpoint in self.endpoints if endpoint.latencies),
+                          key=lambda endpoint: endpoint.cooldown_until)
+
+    def with_failover(self, func: Callable[[RpcEndpoint], T], measure: bool = True) -> Optional[T]:
+        """
+        Вызывает func на RPC в порядке candidates(), пока один из них не ответит.
+        Любая ошибка внутри func считается ошибкой RPC: он уходит на паузу, и запрос повторяется на следующем.
+        :param measure: Учитывать время успешного вызова как задержку RPC (не нужно для пакетных запросов)
+        :return: Результат func или None, если не ответил ни один RPC
+        """
+        for endpoint in self.candidates():
+            started = time.monotonic()
+            try:
+                result = func(endpoint)
+            except Exception as e:
+                self.report_error(endpoint.url, e)
+                continue
+            if measure:
+                self.report_success(endpoint.url, time.monotonic() - started)
+            return result
+        return None
+
+    async def async_with_failover(self, func: Callable[[RpcEndpoint], Awaitable[T]],
+                                  measure: bool = True) -> Optional[T]:
+        """Асинхронный вариант with_failover."""
+        for endpoint in self.candidates():
+            started = time.monotonic()
+            try:
+                result = await func(endpoint)
+            except Exception as e:
+                self.report_error(endpoint.url, e)
+                continue
+            if measure:
+                self.report_success(endpoint.url, time.monotonic() - started)
+            return result
+        return None
@@ -0,0 +1,99 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from eth_account import Account
+from hexbytes import HexBytes
+from loguru import logger
+
+
+class SignedTx(NamedTuple):
+    """Подписанная транзакция, вернувшаяся из процесса-подписанта."""
+    raw_transaction: HexBytes
+    hash: HexBytes
+
+
+def _derive_address(private_key: str) -> Optional[str]:
+    try:
+        return Account.from_key(private_key).address
+    except ValueError:
+        return None  # некорректный ключ, ошибку покажет отправитель при обработке кошелька
+
+
+def _derive_chunk(private_keys: List[str]) -> List[Optional[str]]:
+    return [_derive_address(private_key) for private_key in private_keys]
+
+
+def _sign_tx(tx_params: dict, private_key: str) -> tuple:
+    signed_tx = Account.sign_transaction(tx_params, private_key)
+    return bytes(signed_tx.raw_transaction), bytes(signed_tx.hash)
+
+
+class KeySigner:
+    """
+    Вывод адресов и подпись транзакций в пуле процессов.
+    secp256k1 и keccak нагружают процессор, поэтому при десятках тысяч ключей адреса считаются
+    параллельно один раз при старте, а асинхронный режим подписывает транзакции вне цикла событий.
+    Небольшие файлы ключей обрабатываются в текущем процессе: запуск пула обошёлся бы дороже.
+    """
+
+    def __init__(self, workers: int = 0, chunk_size: int = 256, min_parallel: int = 1000):
+        """
+        :param workers: Число процессов (0 — по числу ядер, 1 — без пула)
+        :param chunk_size: Сколько ключей отдавать процессу за раз
+        :param min_parallel: С какого числа ключей считать адреса в пуле
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        self._addresses: Dict[str, str] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 1 and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def derive_addresses(self, private_keys: Iterable[str]) -> List[Optional[str]]:
+        """Адреса всех ключей (в том же порядке, None для некорректных); результат запоминается для address()."""
+        private_keys = list(private_keys)
+        if len(private_keys) < self.min_parallel or self._executor() is None:
+            addresses = _derive_chunk(private_keys)
+        else:
+            chunks = [private_keys[i:i + self.chunk_size] for i in range(0, len(private_keys), self.chunk_size)]
+            addresses = [address for chunk in self._executor().map(_derive_chunk, chunks) for address in chunk]
+        self._addresses.update((key, address) for key, address in zip(private_keys, addresses) if address)
+        invalid = addresses.count(None)
+        logger.info(f"Адреса кошельков посчитаны: {len(addresses) - invalid}"
+                    + (f", некорректных ключей: {invalid}" if invalid else ""))
+        return addresses
+
+    def address(self, private_key: str) -> str:
+        """Адрес ключа из заранее посчитанных (или сразу в текущем процессе; ValueError для некорректного ключа)."""
+        address = self._addresses.get(private_key)
+        if address is None:
+            address = self._addresses[private_key] = Account.from_key(private_key).address
+        return address
+
+    def known_address(self, private_key: str) -> Optional[str]:
+        """Заранее посчитанный адрес ключа или None."""
+        return self._addresses.get(private_key)
+
+    def sign(self, tx_params: dict, private_key: str) -> SignedTx:
+        raw_transaction, tx_hash = _sign_tx(tx_params, private_key)
+        return SignedTx(HexBytes(raw_transaction), HexBytes(tx_hash))
+
+    async def async_sign(self, tx_params: dict, private_key: str) -> SignedTx:
+        """Подписывает транзакцию в пуле процессов, не блокируя цикл событий."""
+        executor = self._executor()
+        if executor is None:
+            return self.sign(tx_params, private_key)
+        raw_transaction, tx_hash = await asyncio.get_running_loop().run_in_executor(
+            executor, _sign_tx, tx_params, private_key)
+        return SignedTx(HexBytes(raw_transaction), HexBytes(tx_hash))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,264 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from utils.blockchain import connect_sender
+from utils.fee_oracle import FeeOracle
+from utils.functions import deposit_template, get_quote, plan_deposits
+from utils.journal import RunJournal
+from utils.metadata_cache import atomic_write
+from utils.metrics import metrics
+from utils.models import Chain, ContractDepositTxn, Quote
+from utils.receipt_tracker import ReceiptTracker
+from utils.rpc_batch import BatchError, batch_with_failover, fetch_balances_and_nonces
+from utils.rpc_pool import RpcPool
+from utils.signer import KeySigner
+
+
+class PlannedDeposit(BaseModel):
+    """Депозит из плана: готовая транзакция из финального quote."""
+    output_chain: str
+    amount: int
+    to: str
+    data: str
+    value: str  # сумма в wei, hex-строка
+
+
+class WalletPlan(BaseModel):
+    """План кошелька: состояние на момент симуляции, газ и депозиты (без приватного ключа)."""
+    address: str
+    status: str = 'ready'  # ready / dust / failed
+    error: str = ''
+    balance: int = 0
+    nonce: int = 0
+    gas_estimate: int = 0
+    gas_cost: int = 0  # максимальная стоимость газа всех депозитов кошелька
+    deposits: List[PlannedDeposit] = []
+
+
+class DepositPlan(BaseModel):
+    """
+    План прогона из --simulate: точные суммы, газ и транзакции всех кошельков.
+    Выполняется через --plan без повторных quote и оценок газа, пока не истёк expires_at.
+    """
+    created_at: float
+    expires_at: float
+    input_chain: str
+    chain_id: int
+    base_fee: int
+    max_priority_fee: int
+    max_fee: int
+    wallets: List[WalletPlan]
+
+    @property
+    def ready(self) -> List[WalletPlan]:
+        return [wallet for wallet in self.wallets if wallet.status == 'ready']
+
+
+def _error_text(error: BatchError) -> str:
+    details = error.args[0] if error.args else error
+    return details.get('message', str(details)) if isinstance(details, dict) else str(details)
+
+
+def _fail(wallet: WalletPlan, status: str, error: str):
+    wallet.status = status
+    wallet.error = error
+
+
+def simulate(addresses: Sequence[str], input_chain: Chain, routes: List[Tuple[Chain, float]], rpc_pool: RpcPool,
+             fee_oracle: FeeOracle, amount_out, deposits: int = 1, ttl: float = 600, concurrency: int = 10,
+             chunk_size: int = 100) -> DepositPlan:
+    """
+    Пробный прогон без отправки транзакций. Для всех кошельков сразу, пакетными JSON-RPC запросами:
+    баланс и nonce, eth_estimateGas по шаблону депозита, затем финальные quote (параллельно, до concurrency
+    запросов) и eth_call каждой готовой транзакции с точной суммой и ценой газа.
+    :param addresses: Адреса кошельков
+    :param ttl: Сколько секунд план можно выполнять без повторных quote
+    :return: План с точными суммами и газом; кошельки, которые не пройдут, отмечены статусом и причиной
+    """
+    w3 = rpc_pool.w3()
+    fees = fee_oracle.get(w3)
+    max_priority_fee = fees.priority_fee(fee_oracle.tip_percentile)
+    max_fee = fee_oracle.max_fee(fees)
+    tx_per_wallet = deposits * len(routes)
+    min_amount = int(input_chain.minOutboundNative)
+    wallets = [WalletPlan(address=address) for address in addresses]
+
+    # 1. Балансы и nonce всех кошельков
+    states = fetch_balances_and_nonces(rpc_pool, [wallet.address for wallet in wallets], chunk_size)
+    for wallet in wallets:
+        state = states.get(wallet.address)
+        if state is None:
+            _fail(wallet, 'failed', "RPC не вернул баланс и nonce кошелька")
+        else:
+            wallet.balance, wallet.nonce = state
+
+    # 2. Оценка газа по шаблону депозитной транзакции (шаблон один на пару сетей)
+    estimated = []
+    calls = []
+    for wallet in wallets:
+        if wallet.status != 'ready':
+            continue
+        preliminary_amount = int(wallet.balance * 0.95)
+        if amount_out:
+            preliminary_amount = round(random.uniform(amount_out[0], amount_out[1]), 6)
+        template = deposit_template(input_chain, routes[0][0], preliminary_amount, wallet.address)
+        if template is None:
+            _fail(wallet, 'failed', "Не удалось получить quote от API")
+            continue
+        estimated.append(wallet)
+        calls.append(('eth_estimateGas', [{'from': wallet.address, 'to': template.to,
+                                           'value': hex(int(preliminary_amount)), 'data': template.data}]))
+    with metrics.span('estimate'):
+        results = batch_with_failover(rpc_pool, calls, chunk_size)
+    for wallet, gas_estimate in zip(estimated, results):
+        if isinstance(gas_estimate, BatchError):
+            _fail(wallet, 'failed', f"Ошибка при оценке газа: {_error_text(gas_estimate)}")
+            continue
+        wallet.gas_estimate = int(gas_estimate, 16)
+        wallet.gas_cost = int(wallet.gas_estimate * 1.25) * max_fee * tx_per_wallet
+
+    # 3. Точные суммы депозитов и проверка минимальной суммы
+    planned: Dict[str, List[Tuple[Chain, int]]] = {}
+    for wallet in wallets:
+        if wallet.status != 'ready':
+            continue
+        planned[wallet.address] = plan_deposits(wallet.balance - wallet.gas_cost, routes, deposits)
+        deposit_amount = min(amount for _, amount in planned[wallet.address])
+        if deposit_amount < min_amount:
+            _fail(wallet, 'dust', f"Сумма депозита после вычета газа {deposit_amount} wei "
+                                  f"меньше минимально допустимой {min_amount} wei")
+
+    # 4. Финальные quote с точными суммами, параллельно
+    jobs = [(wallet, chain, amount) for wallet in wallets if wallet.status == 'ready'
+            for chain, amount in planned[wallet.address]]
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        quotes = list(executor.map(lambda job: get_quote(input_chain, job[1], job[2], job[0].address,
+                                                         job[0].address), jobs))
+    for (wallet, chain, amount), quote_data in zip(jobs, quotes):
+        if quote_data is None:
+            _fail(wallet, 'failed', "Не удалось получить финальный quote от API")
+            continue
+        txn = quote_data.contractDepositTxn
+        wallet.deposits.append(PlannedDeposit(output_chain=chain.name, amount=amount, to=txn.to, data=txn.data,
+                                              value=txn.value))
+
+    # 5. eth_call каждой готовой транзакции: узел проверяет, что баланса хватит на сумму и газ по плану
+    checked = [(wallet, deposit) for wallet in wallets if wallet.status == 'ready' for deposit in wallet.deposits]
+    calls = [('eth_call', [{'from': wallet.address, 'to': deposit.to, 'value': deposit.value, 'data': deposit.data,
+                            'gas': hex(int(wallet.gas_estimate * 1.25)), 'maxFeePerGas': hex(max_fee),
+                            'maxPriorityFeePerGas': hex(max_priority_fee)}, 'latest'])
+             for wallet, deposit in checked]
+    with metrics.span('simulate'):
+        results = batch_with_failover(rpc_pool, calls, chunk_size)
+    for (wallet, deposit), result in zip(checked, results):
+        if isinstance(result, BatchError) and wallet.status == 'ready':
+            _fail(wallet, 'failed', f"eth_call депозита в {deposit.output_chain}: {_error_text(result)}")
+
+    for wallet in wallets:
+        if wallet.status != 'ready':
+            wallet.deposits = []
+    created_at = time.time()
+    return DepositPlan(created_at=created_at, expires_at=created_at + ttl, input_chain=input_chain.name,
+                       chain_id=int(input_chain.chain), base_fee=fees.base_fee,
+                       max_priority_fee=max_priority_fee, max_fee=max_fee, wallets=wallets)
+
+
+def log_plan(plan: DepositPlan, decimals: int, symbol: str):
+    ready = plan.ready
+    total = sum(deposit.amount for wallet in ready for deposit in wallet.deposits)
+    gas = sum(wallet.gas_cost for wallet in ready)
+    logger.info(f"План: готовых кошельков {len(ready)} из {len(plan.wallets)}, депозитов "
+                f"{sum(len(wallet.deposits) for wallet in ready)} на {total / 10 ** decimals:.6f} {symbol}, "
+                f"газ не более {gas / 10 ** decimals:.6f} {symbol} (maxFeePerGas {plan.max_fee} wei)")
+    for wallet in plan.wallets:
+        if wallet.status != 'ready':
+            logger.warning(f"{wallet.address}: {wallet.status} — {wallet.error}")
+
+
+def write_plan(plan: DepositPlan, path: Path):
+    atomic_write(Path(path), plan.model_dump_json(indent=2).encode('utf-8'))
+    logger.success(f"План сохранён в {path}, действителен до "
+                   f"{time.strftime('%H:%M:%S', time.localtime(plan.expires_at))}")
+
+
+def load_plan(path: Path) -> Optional[DepositPlan]:
+    """План из файла или None, если файл не читается или план устарел."""
+    try:
+        plan = DepositPlan.model_validate_json(Path(path).read_bytes())
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось прочитать план {path}: {e}")
+        return None
+    if time.time() > plan.expires_at:
+        logger.error(f"План {path} устарел (quote действительны до "
+                     f"{time.strftime('%H:%M:%S', time.localtime(plan.expires_at))}), запустите --simulate заново")
+        return None
+    return plan
+
+
+def execute_plan(plan: DepositPlan, wallet_keys: Sequence[str], addresses: Dict[str, Optional[str]],
+                 input_chain: Chain, rpc_pool: RpcPool, fee_oracle: FeeOracle, tracker: ReceiptTracker,
+                 journal: RunJournal, signer: Optional[KeySigner] = None, delay: Tuple[int, int] = (0, 0),
+                 sent: Optional[Dict[str, int]] = None) -> int:
+    """
+    Отправляет депозиты готовых кошельков плана с ценой газа и лимитом из плана, без quote и оценки газа.
+    Кошелёк пропускается, если с момента симуляции баланс уменьшился
+    или базовая комиссия выросла выше maxFeePerGas плана.
+    :param sent: {адрес: сколько транзакций уже отправлено} — эти депозиты плана пропускаются при продолжении
+    :return: Число кошельков, все депозиты которых отправлены
+    """
+    by_address = {wallet.address: wallet for wallet in plan.ready}
+    keys = [key for key in wallet_keys if addresses.get(key) in by_address]
+    logger.info(f"Выполняем план: кошельков {len(keys)} из {len(by_address)} готовых в плане")
+    explorer_url = input_chain.explorer.rstrip('/')
+    sent = 0
+    for i, private_key in enumerate(keys):
+        wallet = by_address[addresses[private_key]]
+        prefix = f"[{i + 1}/{len(keys)}] {wallet.address}"
+        wallet_started = time.monotonic()
+        try:
+            sender = connect_sender(private_key, rpc_pool, input_chain, fee_oracle, signer)
+            if sender is None:
+                logger.error(f"{prefix} Не удалось подключиться ни к одному RPC для сети {input_chain.name}")
+                continue
+
+            deposits = wallet.deposits[(sent or {}).get(wallet.address, 0):]
+            required = sum(deposit.amount for deposit in deposits) + wallet.gas_cost
+            if sender.balance < required:
+                logger.warning(f"{prefix} Баланс уменьшился после симуляции ({sender.balance} < {required} wei). "
+                               f"Пропускаем.")
+                continue
+            if sender.snapshot.base_fee > plan.max_fee:
+                logger.warning(f"{prefix} Базовая комиссия {sender.snapshot.base_fee} выше maxFeePerGas плана "
+                               f"{plan.max_fee}. Пропускаем.")
+                continue
+            # Газ по плану: суммы депозитов посчитаны под эту цену
+            sender.snapshot.base_fee = plan.base_fee
+            sender.snapshot.max_priority_fee = plan.max_priority_fee
+
+            quotes = [Quote(contractDepositTxn=ContractDepositTxn(to=deposit.to, data=deposit.data,
+                                                                  value=deposit.value))
+                      for deposit in deposits]
+            journal.record(sender.address, 'quoted')
+            sender.on_signed = lambda address, tx_hash: journal.record(address, 'signed', tx_hash)
+            tx_hashes = sender.send_transactions(quotes, gas_estimate=wallet.gas_estimate, wait=False)
+            for tx_hash in tx_hashes:
+                journal.record(sender.address, 'broadcast', tx_hash.to_0x_hex())
+                tracker.track(tx_hash, sender.address, replace=sender.replace_transaction)
+                logger.success(f"{prefix} Транзакция отправлена по плану: {explorer_url}/tx/0x{tx_hash.hex()}")
+            sent += len(tx_hashes) == len(quotes)
+        except Exception as e:
+            logger.error(f"{prefix} Ошибка при отправке по плану: {e}")
+        finally:
+            metrics.observe('wallet', time.monotonic() - wallet_started, wallet.address)
+
+        if i < len(keys) - 1 and delay[1]:
+            pause = random.randint(delay[0], delay[1])
+            logger.info(f"Пауза. Ждем {pause} секунд перед следующим кошельком...")
+            time.sleep(pause)
+    return sent
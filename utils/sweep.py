@@ -0,0 +1,219 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from utils.async_pipeline import process_wallet
+from utils.config import config, transport
+from utils.fee_oracle import FeeOracle, make_fee_oracle
+from utils.functions import GAS_ZIP_API, build_routes, chain_rpc_urls
+from utils.metrics import metrics
+from utils.models import Chain
+from utils.nonce_manager import NonceManager
+from utils.receipt_tracker import ReceiptTracker
+from utils.rpc_pool import RpcPool
+from utils.signer import KeySigner
+from utils.triage import log_triage, prescan, prescan_threshold
+
+
+@dataclass
+class ChainQueue:
+    """
+    Очередь кошельков одной входной сети при сборе средств с нескольких сетей.
+    У каждой сети свои пул RPC, FeeOracle, менеджер nonce (один кошелёк может работать в нескольких сетях сразу),
+    трекер чеков и ограничение параллельности.
+    """
+    input_chain: Chain
+    concurrency: int
+    routes: List[Tuple[Chain, float]] = field(default_factory=list)
+    rpc_pool: Optional[RpcPool] = None
+    fee_oracle: Optional[FeeOracle] = None
+    nonce_manager: NonceManager = field(default_factory=NonceManager)
+    tracker: Optional[ReceiptTracker] = None
+    private_keys: List[str] = field(default_factory=list)
+    status: str = 'discovery'  # discovery / running / done / failed
+    processed: int = 0
+    success: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.input_chain.name
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+def prepare_chain(queue: ChainQueue, output_chains: List[Tuple[Chain, float]],
+                  addresses: Dict[str, Optional[str]], deposits: int) -> bool:
+    """
+    Подготовка очереди сети: маршруты, опрос RPC и пакетная проверка балансов всех кошельков.
+    В очередь попадают только кошельки, которым хватает на минимальный депозит и газ.
+    :return: True, если в сети есть что обрабатывать; при ошибке queue.status = 'failed'
+    """
+    input_chain = queue.input_chain
+    queue.routes = build_routes([(chain, weight) for chain, weight in output_chains
+                                 if str(chain.chain) != str(input_chain.chain)])
+    if not queue.routes:
+        logger.warning(f"{queue.name}: выходные сети совпадают со входной, пропускаем")
+        queue.status = 'failed'
+        return False
+
+    rpc_urls = chain_rpc_urls(input_chain)
+    if not rpc_urls:
+        logger.error(f"{queue.name}: не смог найти RPC сети")
+        queue.status = 'failed'
+        return False
+    queue.rpc_pool = RpcPool(rpc_urls, transport=transport)
+    if not queue.rpc_pool.probe_all():
+        logger.error(f"{queue.name}: ни один RPC не отвечает")
+        queue.status = 'failed'
+        return False
+    queue.fee_oracle = make_fee_oracle()
+
+    wallet_keys = [key for key, address in addresses.items() if address is not None]
+    if config.get('PRESCAN', True):
+        threshold = prescan_threshold(queue.rpc_pool, queue.fee_oracle, input_chain, deposits * len(queue.routes))
+        triage = prescan(queue.rpc_pool, {key: addresses[key] for key in wallet_keys}, threshold)
+        log_triage(triage, threshold, input_chain.decimals, f"{input_chain.symbol} ({queue.name})")
+        wallet_keys = [wallet.private_key for wallet in triage if wallet.status in ('ready', 'unknown')]
+    queue.private_keys = wallet_keys
+    if not wallet_keys:
+        logger.info(f"{queue.name}: нет кошельков с достаточным балансом")
+        queue.status = 'done'
+        return False
+
+    explorer_url = input_chain.explorer.rstrip('/')
+    queue.tracker = ReceiptTracker(
+        queue.rpc_pool,
+        timeout=float(config.get('RECEIPT_TIMEOUT', 300)),
+        gas_zip_api=GAS_ZIP_API if config.get('TRACK_GAS_ZIP_STATUS', True) else None,
+        outbound_batch=int(config.get('GAS_ZIP_STATUS_BATCH', 20)),
+        on_confirmed=lambda tx: logger.success(f"{queue.name}: транзакция подтверждена в блоке {tx.block_number}: "
+                                               f"{explorer_url}/tx/{tx.hex}"),
+        on_reverted=lambda tx: logger.error(f"{queue.name}: транзакция откатилась: {explorer_url}/tx/{tx.hex}"),
+        on_timeout=lambda tx: logger.error(f"{queue.name}: транзакция не подтверждена за отведённое время: "
+                                           f"{explorer_url}/tx/{tx.hex}"),
+    ).start()
+    return True
+
+
+async def run_chain(session: aiohttp.ClientSession, queue: ChainQueue, output_chains: List[Tuple[Chain, float]],
+                    addresses: Dict[str, Optional[str]], amount_out, deposits: int, start_jitter: float,
+                    signer: Optional[KeySigner], outbound_timeout: float):
+    """
+    Подготовка сети в отдельном потоке, затем обработка её кошельков queue.concurrency воркерами.
+    Сети не ждут друг друга: медленная сеть занимает только свои воркеры.
+    """
+    try:
+        ready = await asyncio.to_thread(prepare_chain, queue, output_chains, addresses, deposits)
+    except Exception as e:
+        logger.error(f"{queue.name}: ошибка подготовки сети: {e}")
+        queue.status = 'failed'
+        ready = False
+    if not ready:
+        return
+
+    jobs: asyncio.Queue = asyncio.Queue()
+    for i, private_key in enumerate(queue.private_keys):
+        jobs.put_nowait((i + 1, private_key))
+    total = len(queue.private_keys)
+
+    async def worker():
+        # Случайное смещение старта воркера, чтобы кошельки сети не уходили в сеть одновременно
+        if start_jitter:
+            await asyncio.sleep(random.uniform(0, start_jitter))
+        while True:
+            try:
+                index, private_key = jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.monotonic()
+            ok = False
+            try:
+                ok = await process_wallet(session, index, total, private_key, queue.input_chain, queue.routes,
+                                          queue.rpc_pool, queue.fee_oracle, amount_out, deposits, queue.tracker,
+                                          signer=signer, nonce_manager=queue.nonce_manager)
+            except ValueError as e:
+                logger.error(f"{queue.name} [{index}/{total}] Проблема с кошельком: {e}")
+            except Exception as e:
+                logger.error(f"{queue.name} [{index}/{total}] Произошла непредвиденная ошибка: {e}")
+            finally:
+                metrics.observe('wallet', time.monotonic() - started, addresses.get(private_key))
+                queue.processed += 1
+                queue.success += ok
+
+    queue.status = 'running'
+    queue.started = time.monotonic()
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(min(queue.concurrency, total), 1))))
+    finally:
+        queue.finished = time.monotonic()
+        await asyncio.to_thread(queue.tracker.close, outbound_timeout)
+    queue.status = 'done'
+    logger.success(f"{queue.name}: обработано кошельков {queue.processed} (успешно {queue.success}) "
+                   f"за {queue.elapsed:.1f} с")
+
+
+def log_progress(queues: List[ChainQueue]):
+    """Общий прогресс по всем сетям одной строкой."""
+    parts = []
+    for queue in queues:
+        if queue.status == 'discovery':
+            parts.append(f"{queue.name}: проверка балансов")
+        elif queue.private_keys:
+            parts.append(f"{queue.name}: {queue.processed}/{len(queue.private_keys)}")
+    processed = sum(queue.processed for queue in queues)
+    total = sum(len(queue.private_keys) for queue in queues)
+    logger.info(f"Прогресс: {processed}/{total} кошельков" + (f" ({'; '.join(parts)})" if parts else ""))
+
+
+def log_sweep_summary(queues: List[ChainQueue]):
+    """Итоговая таблица по сетям: кошельки, успешные, подтверждённые транзакции и скорость."""
+    rows = [f"{'Сеть':<20} {'статус':<8} {'кошельков':>9} {'успешно':>8} {'подтв. tx':>9} {'время, с':>9} "
+            f"{'кош./мин':>9}"]
+    for queue in queues:
+        confirmed = queue.tracker.summary().get('confirmed', 0) if queue.tracker is not None else 0
+        rate = queue.processed / queue.elapsed * 60 if queue.elapsed > 0 else 0.0
+        rows.append(f"{queue.name[:20]:<20} {queue.status:<8} {len(queue.private_keys):>9} {queue.success:>8} "
+                    f"{confirmed:>9} {queue.elapsed:>9.1f} {rate:>9.1f}")
+    logger.info("Итог по входным сетям:\n" + "\n".join(rows))
+
+
+async def run_sweep(input_chains: List[Tuple[Chain, int]], output_chains: List[Tuple[Chain, float]],
+                    addresses: Dict[str, Optional[str]], amount_out, deposits: int = 1, start_jitter: float = 0,
+                    signer: Optional[KeySigner] = None, outbound_timeout: float = 0,
+                    progress_interval: float = 30) -> List[ChainQueue]:
+    """
+    Сбор средств с нескольких входных сетей: все сети обрабатываются параллельно, у каждой своя очередь.
+    :param input_chains: Входные сети и их параллельность, см. search_sweep_chains
+    :param addresses: {приватный ключ: адрес (None для некорректного ключа)}
+    :param progress_interval: Как часто писать общий прогресс, в секундах
+    :return: Очереди сетей со статистикой
+    """
+    queues = [ChainQueue(input_chain=chain, concurrency=concurrency) for chain, concurrency in input_chains]
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            log_progress(queues)
+
+    async with transport.async_session() as session:
+        progress = asyncio.create_task(report_progress())
+        try:
+            await asyncio.gather(*(run_chain(session, queue, output_chains, addresses, amount_out, deposits,
+                                             start_jitter, signer, outbound_timeout) for queue in queues))
+        finally:
+            progress.cancel()
+
+    log_progress(queues)
+    log_sweep_summary(queues)
+    return queues
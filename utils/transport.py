@@ -0,0 +1,149 @@
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from web3 import AsyncWeb3, Web3
+
+from utils.metrics import metrics
+from utils.rate_limiter import RateLimiter
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter, пропускающий каждый запрос через RateLimiter и сообщающий ему статус ответа;
+    задержки и ошибки запросов записываются в метрики по хостам.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.acquire(request.url)
+        host = urlparse(request.url).hostname
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            metrics.record_endpoint(host, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_endpoint(host, time.perf_counter() - started, error=response.status_code >= 400)
+        self.rate_limiter.report(request.url, response.status_code, response.headers.get('Retry-After'))
+        return response
+
+
+class Transport:
+    """
+    Общий HTTP-транспорт для API Gas.zip и всех Web3-провайдеров.
+    Держит keep-alive пулы соединений по хостам, чтобы каждый запрос не платил за новый TCP+TLS handshake,
+    и считает по каждому хосту, сколько соединений открыто и сколько раз они переиспользованы.
+    Все запросы (синхронные и асинхронные) проходят через общий RateLimiter по хостам.
+    """
+
+    def __init__(self, pool_connections: int = 100, pool_maxsize: int = 20, timeout: float = 10,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """
+        :param pool_connections: Сколько хостов держать в пуле одновременно
+        :param pool_maxsize: Максимум соединений к одному хосту
+        :param timeout: Таймаут запроса по умолчанию в секундах
+        :param rate_limiter: Ограничение частоты запросов по хостам (по умолчанию 10 запросов/с)
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.session = requests.Session()
+        self._adapter = RateLimitedAdapter(self.rate_limiter, pool_connections=pool_connections,
+                                           pool_maxsize=pool_maxsize)
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        # Счётчики aiohttp-сессий: хост -> {'opened': n, 'reused': n}
+        self._async_counters = defaultdict(lambda: {'opened': 0, 'reused': 0})
+
+    @classmethod
+    def from_config(cls, config) -> "Transport":
+        """Создаёт транспорт с размерами пулов, таймаутом и лимитами запросов из setting.yaml."""
+        config = config or {}
+        return cls(pool_connections=int(config.get('HTTP_POOL_CONNECTIONS', 100)),
+                   pool_maxsize=int(config.get('HTTP_POOL_SIZE', 20)),
+                   timeout=float(config.get('HTTP_TIMEOUT', 10)),
+                   rate_limiter=RateLimiter.from_config(config))
+
+    def request(self, method: str = "GET", url: str = None, **kwargs) -> requests.Response:
+        """requests.request через общую сессию с таймаутом по умолчанию."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method=method, url=url, **kwargs)
+
+    def http_provider(self, url: str, timeout: float = None) -> Web3.HTTPProvider:
+        """Web3-провайдер, использующий общую сессию."""
+        return Web3.HTTPProvider(url, request_kwargs={'timeout': timeout or self.timeout}, session=self.session)
+
+    def async_session(self) -> aiohttp.ClientSession:
+        """
+        Новая aiohttp-сессия с keep-alive пулом, подсчётом соединений и ограничением частоты запросов.
+        Создавать внутри работающего event loop, одну на весь прогон.
+        """
+        counters = self._async_counters
+        rate_limiter = self.rate_limiter
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            await rate_limiter.async_acquire(str(params.url))
+            ctx.started = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            metrics.record_endpoint(ctx.host, time.perf_counter() - ctx.started, error=params.response.status >= 400)
+            rate_limiter.report(str(params.url), params.response.status, params.response.headers.get('Retry-After'))
+
+        async def on_request_exception(session, ctx, params):
+            metrics.record_endpoint(ctx.host, time.perf_counter() - getattr(ctx, 'started', time.perf_counter()),
+                                    error=True)
+
+        async def on_connection_create_end(session, ctx, params):
+            counters[ctx.host]['opened'] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            counters[ctx.host]['reused'] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(limit=self.pool_connections * self.pool_maxsize,
+                                         limit_per_host=self.pool_maxsize)
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config],
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    @staticmethod
+    async def async_http_provider(url: str, session: aiohttp.ClientSession) -> AsyncWeb3.AsyncHTTPProvider:
+        """Асинхронный Web3-провайдер, использующий общую aiohttp-сессию."""
+        provider = AsyncWeb3.AsyncHTTPProvider(url)
+        await provider.cache_async_session(session)
+        return provider
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Открытые и переиспользованные соединения по хостам (синхронные и асинхронные)."""
+        result = defaultdict(lambda: {'opened': 0, 'reused': 0})
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            result[pool.host]['opened'] += pool.num_connections
+            result[pool.host]['reused'] += max(pool.num_requests - pool.num_connections, 0)
+        for host, counter in self._async_counters.items():
+            result[host]['opened'] += counter['opened']
+            result[host]['reused'] += counter['reused']
+        return dict(result)
+
+    def log_stats(self):
+        """Выводит в лог статистику соединений по хостам."""
+        for host, counter in sorted(self.stats().items()):
+            logger.info(f"HTTP {host}: открыто соединений {counter['opened']}, переиспользовано {counter['reused']}")
+        self.rate_limiter.log_stats()
@@ -0,0 +1,89 @@
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from utils.config import config
+from utils.fee_oracle import FeeOracle
+from utils.models import Chain
+from utils.rpc_batch import fetch_balances
+from utils.rpc_pool import RpcPool
+
+
+@dataclass
+class WalletTriage:
+    """Результат предварительной проверки кошелька."""
+    private_key: str = field(repr=False)
+    address: Optional[str]
+    balance: Optional[int] = None
+    status: str = 'unknown'  # ready / dust / invalid / unknown
+
+
+def prescan_threshold(rpc_pool: RpcPool, fee_oracle: FeeOracle, input_chain: Chain, tx_per_wallet: int) -> int:
+    """
+    Минимальный баланс годного кошелька: минимальный депозит Gas.zip на каждую транзакцию
+    и газ с запасом 25% (PRESCAN_GAS_LIMIT на транзакцию) по текущей цене.
+    Если цену газа узнать не удалось, учитывается только минимальный депозит.
+    """
+    try:
+        max_fee = fee_oracle.max_fee(fee_oracle.get(rpc_pool.w3()))
+    except Exception as e:
+        logger.warning(f"{input_chain.name}: не удалось получить цену газа для предварительной проверки: {e}")
+        max_fee = 0
+    gas_reserve = int(int(config.get('PRESCAN_GAS_LIMIT', 50000)) * 1.25) * max_fee * tx_per_wallet
+    return int(input_chain.minOutboundNative) * tx_per_wallet + gas_reserve
+
+
+def prescan(rpc_pool: RpcPool, addresses: Dict[str, Optional[str]], threshold: int,
+            chunk_size: int = 500) -> List[WalletTriage]:
+    """
+    Запрашивает балансы всех кошельков пакетами до обращения к Gas.zip и делит их на годные и «пыль».
+    Кошельки, баланс которых узнать не удалось, остаются в работе (статус unknown) и проверяются как раньше.
+    :param addresses: {приватный ключ: адрес (None для некорректного ключа)}
+    :param threshold: Минимальный баланс в wei, с которым кошелёк имеет смысл обрабатывать
+    :return: Кошельки со статусами: сначала годные по убыванию баланса, затем unknown, затем остальные
+    """
+    wallets = [WalletTriage(private_key, address) for private_key, address in addresses.items()]
+    for wallet in wallets:
+        if wallet.address is None:
+            wallet.status = 'invalid'
+
+    pending = [wallet.address for wallet in wallets if wallet.status == 'unknown']
+    balances = fetch_balances(rpc_pool, pending, chunk_size)
+
+    for wallet in wallets:
+        if wallet.status != 'unknown':
+            continue
+        wallet.balance = balances.get(wallet.address)
+        if wallet.balance is not None:
+            wallet.status = 'ready' if wallet.balance >= threshold else 'dust'
+
+    order = {'ready': 0, 'unknown': 1, 'dust': 2, 'invalid': 3}
+    wallets.sort(key=lambda wallet: (order[wallet.status], -(wallet.balance or 0)))
+    return wallets
+
+
+def log_triage(wallets: List[WalletTriage], threshold: int, decimals: int, symbol: str):
+    counts = {status: sum(wallet.status == status for wallet in wallets)
+              for status in ('ready', 'dust', 'unknown', 'invalid')}
+    total_ready = sum(wallet.balance for wallet in wallets if wallet.status == 'ready')
+    logger.info(f"Предварительная проверка: годных {counts['ready']} "
+                f"(всего {total_ready / 10 ** decimals:.6f} {symbol}), пыль {counts['dust']} "
+                f"(меньше {threshold / 10 ** decimals:.6f} {symbol}), баланс неизвестен {counts['unknown']}, "
+                f"некорректных ключей {counts['invalid']}")
+
+
+def write_triage_report(wallets: List[WalletTriage], path: Path, decimals: int):
+    """Сохраняет отчёт предварительной проверки в CSV (без приватных ключей)."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['address', 'status', 'balance_wei', 'balance'])
+        for wallet in wallets:
+            if wallet.balance is None:
+                writer.writerow([wallet.address or '', wallet.status, '', ''])
+            else:
+                writer.writerow([wallet.address, wallet.status, wallet.balance,
+                                 f"{wallet.balance / 10 ** decimals:.6f}"])
+    logger.info(f"Отчёт предварительной проверки сохранён в {path}")